@@ -1,10 +1,75 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from controller.maps_controller import maps_controller  # Make sure this import is compatible with FastAPI
 from controller.user_controller import user_controller
+from controller.health_controller import health_controller
+from helper.google_client import get_google_client, close_google_client
+from helper.es_client import get_es, close_es
+from helper.passwords import shutdown_password_executor
+from helper.index_mappings import ensure_indices
+from helper.metrics import metrics_middleware, render_metrics
+import logger
+from service import rating_service
+from service import maps_service
+from helper import notification
+import server_properties
 
-app = FastAPI()
+log = logger.get_logger()
+
+try:
+    import orjson
+
+    class DefaultResponse(JSONResponse):
+        # fastapi.responses.ORJSONResponse is deprecated, so render with orjson directly
+        def render(self, content) -> bytes:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    DefaultResponse = JSONResponse
+
+try:
+    from brotli_asgi import BrotliMiddleware
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Responses smaller than this are sent uncompressed; compressing them costs more than it saves
+COMPRESSION_MINIMUM_SIZE = 1024
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the logging thread, load settings and create the shared clients in the worker, after any fork
+    logger.start_queue_logging()
+    server_properties.get_settings()
+    get_es()
+    get_google_client()
+    try:
+        await ensure_indices()
+    except Exception as e:
+        # The restaurant cache retries index setup on first use, so a slow cluster does not block startup
+        log.error(f"Index setup failed at startup: {e}")
+    await notification.get_dispatcher().start()
+    reconcile_task = None
+    if server_properties.RATING_RECONCILE_INTERVAL_MINUTES > 0:
+        reconcile_task = asyncio.create_task(rating_service.run_rating_reconcile_loop())
+    yield
+    if reconcile_task:
+        reconcile_task.cancel()
+    await notification.get_dispatcher().stop()
+    await maps_service.cancel_nearby_fills()
+    # Release pooled upstream connections on shutdown
+    await close_google_client()
+    await close_es()
+    shutdown_password_executor()
+    logger.stop_queue_logging()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=DefaultResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -15,9 +80,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Brotli for clients that accept it, gzip otherwise
+if BROTLI_AVAILABLE:
+    app.add_middleware(BrotliMiddleware, quality=4, minimum_size=COMPRESSION_MINIMUM_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+
+# Request IDs and per-route latency for every request
+app.middleware("http")(metrics_middleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Register the maps controller router
 app.include_router(maps_controller)
 app.include_router(user_controller)
+app.include_router(health_controller)
 
 if __name__ == '__main__':
    
@@ -0,0 +1,155 @@
+"""
+Local stand-in for the Google Places, Place Details and Geocoding APIs.
+
+Responses are deterministic for a given input and follow the shape of the real
+APIs closely enough for the services in this repo. Every call waits a
+configurable latency first, so benchmarks see a realistic upstream cost.
+
+    python -m benchmarks.google_stub --port 8090 --latency-ms 80 --jitter-ms 20
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+from fastapi import FastAPI, Query
+from fastapi.responses import Response
+import uvicorn
+
+app = FastAPI()
+
+config = {
+    "latency_ms": 50.0,
+    "jitter_ms": 10.0,
+    "places_per_search": 60,
+    "page_size": 20,
+}
+
+# Geocoded addresses are spread over roughly the same area
+BASE_LATITUDE = 40.7128
+BASE_LONGITUDE = -74.0060
+
+
+def _digest(value):
+    return int(hashlib.sha1(value.encode("utf-8")).hexdigest(), 16)
+
+async def _simulate_latency():
+    delay = config["latency_ms"] + random.uniform(-config["jitter_ms"], config["jitter_ms"])
+    await asyncio.sleep(max(delay, 0) / 1000)
+
+
+def _place(latitude, longitude, radius, index):
+    """
+    The index-th place of a search around (latitude, longitude), always the same
+    for the same search area.
+    """
+    seed = _digest(f"{latitude:.3f},{longitude:.3f}:{index}")
+    distance = (seed % 1000) / 1000 * radius * 0.9
+    bearing = (seed // 1000 % 360) * math.pi / 180
+    lat = latitude + distance * math.cos(bearing) / 111320
+    lng = longitude + distance * math.sin(bearing) / (111320 * math.cos(math.radians(latitude)))
+    place_id = f"stub-{seed % 10**12:012d}"
+    return {
+        "place_id": place_id,
+        "name": f"Stub Restaurant {seed % 10000}",
+        "vicinity": f"{seed % 900 + 100} Stub Street",
+        "rating": round(3.0 + (seed % 21) / 10, 1),
+        "geometry": {"location": {"lat": lat, "lng": lng}},
+        "photos": [{"photo_reference": f"photo-{place_id}"}],
+    }
+
+
+@app.get("/maps/api/place/nearbysearch/json")
+async def nearby_search(
+    location: str = None,
+    radius: float = 1000,
+    keyword: str = "restaurant",
+    pagetoken: str = None,
+    key: str = None,
+):
+    await _simulate_latency()
+    if pagetoken:
+        location, radius, offset = pagetoken.split("|")
+        radius, offset = float(radius), int(offset)
+    else:
+        offset = 0
+    latitude, longitude = (float(part) for part in location.split(","))
+
+    end = min(offset + config["page_size"], config["places_per_search"])
+    results = [_place(latitude, longitude, radius, index) for index in range(offset, end)]
+    response = {"status": "OK" if results else "ZERO_RESULTS", "results": results}
+    if end < config["places_per_search"]:
+        response["next_page_token"] = f"{location}|{radius}|{end}"
+    return response
+
+
+@app.get("/maps/api/place/details/json")
+async def place_details(place_id: str, key: str = None):
+    await _simulate_latency()
+    seed = _digest(place_id)
+    return {
+        "status": "OK",
+        "result": {
+            "place_id": place_id,
+            "name": f"Stub Restaurant {seed % 10000}",
+            "rating": round(3.0 + (seed % 21) / 10, 1),
+            "user_ratings_total": seed % 500,
+            "url": f"https://maps.example.com/?cid={seed % 10**12}",
+            "formatted_address": f"{seed % 900 + 100} Stub Street, Stubtown, NY 10001, USA",
+            "adr_address": (
+                f'<span class="street-address">{seed % 900 + 100} Stub Street</span>, '
+                '<span class="locality">Stubtown</span>, <span class="region">NY</span> '
+                '<span class="postal-code">10001</span>, <span class="country-name">USA</span>'
+            ),
+            "photos": [{"photo_reference": f"photo-{place_id}"}],
+            "reviews": [
+                {"author_name": f"Reviewer {i}", "rating": (seed + i) % 5 + 1, "text": "Stub review text."}
+                for i in range(5)
+            ],
+        },
+    }
+
+
+@app.get("/maps/api/geocode/json")
+async def geocode(address: str = None, latlng: str = None, key: str = None):
+    await _simulate_latency()
+    if latlng:
+        return {
+            "status": "OK",
+            "results": [{"formatted_address": f"Stub address near {latlng}"}],
+        }
+    seed = _digest(address.lower())
+    latitude = BASE_LATITUDE + (seed % 2000 - 1000) / 10000
+    longitude = BASE_LONGITUDE + (seed // 2000 % 2000 - 1000) / 10000
+    return {
+        "status": "OK",
+        "results": [{
+            "formatted_address": address,
+            "geometry": {"location": {"lat": latitude, "lng": longitude}},
+        }],
+    }
+
+
+@app.get("/maps/api/place/photo")
+async def photo(photoreference: str = Query(None), maxwidth: int = 400, key: str = None):
+    await _simulate_latency()
+    return Response(content=b"\x89PNG\r\n\x1a\n", media_type="image/png")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Google Maps API stub for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"])
+    parser.add_argument("--places-per-search", type=int, default=config["places_per_search"])
+    args = parser.parse_args()
+
+    config["latency_ms"] = args.latency_ms
+    config["jitter_ms"] = args.jitter_ms
+    config["places_per_search"] = args.places_per_search
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Micro-benchmarks for the in-process hot paths that run on every request.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --output benchmarks/results/micro.json
+"""
+import argparse
+import json
+import os
+import timeit
+from helper import geohash
+from helper.cache import TTLCache
+from helper.metrics import Histogram
+
+
+def cases():
+    cache = TTLCache(maxsize=10000, ttl=300)
+    for i in range(10000):
+        cache.set(f"key-{i}", i)
+    histogram = Histogram("bench_seconds", "Benchmark histogram.", ("route",))
+
+    return {
+        "geohash.covering_cells 1km": lambda: geohash.covering_cells(40.7128, -74.0060, 1000),
+        "geohash.covering_cells 5km": lambda: geohash.covering_cells(40.7128, -74.0060, 5000),
+        "TTLCache.get hit": lambda: cache.get("key-5000"),
+        "TTLCache.set": lambda: cache.set("key-5000", 1),
+        "Histogram.observe": lambda: histogram.observe(0.042, "/maps/nearby_restaurants"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for in-process helpers")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="optional JSON result file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in cases().items():
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=args.repeat, number=number)) / number
+        results[name] = {"us_per_call": round(best * 1e6, 3)}
+        print(f"{name:<32}{best * 1e6:>12.3f} us")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as result_file:
+            json.dump(results, result_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Load test for the API at a fixed concurrency.
+
+By default this starts the Google stub and the app (uvicorn) as subprocesses,
+pointing the app at the stub and at the Elasticsearch from
+benchmarks/docker-compose.yml. It seeds a benchmark user with a few
+favorites, then drives each scenario and reports p50/p95/p99 latency and
+requests per second. Results are written as JSON for later comparison.
+
+    docker compose -f benchmarks/docker-compose.yml up -d
+    python -m benchmarks.run --concurrency 32 --requests 2000
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+Pass --base-url to benchmark an app that is already running instead.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import itertools
+import uuid
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+BENCH_EMAIL = "bench-user@example.com"
+BENCH_PASSWORD = "bench-password"
+LOCATIONS = [
+    "Times Square, New York",
+    "Union Square, New York",
+    "Battery Park, New York",
+    "Astoria, Queens",
+]
+# Search radii in miles, as the API takes them
+RADIUS_MILES = (1, 2, 3, 5)
+SCENARIOS = ("nearby", "nearby_fill", "favorites", "login")
+
+
+def app_environment(args, spool_dir):
+    """
+    Environment for the app subprocess. Values already set in the caller's
+    environment win, so any setting can be overridden for a run.
+    """
+    env = dict(os.environ)
+    defaults = {
+        "GOOGLE_MAPS_API_ROOT": f"http://127.0.0.1:{args.stub_port}",
+        "GOOGLE_API_KEY": "bench",
+        "ES_HOST": "http://localhost:9200",
+        "ES_USERNAME": "elastic",
+        "ES_PASSWORD": "bench",
+        "SECRET_KEY": "bench-secret",
+        "ALGORITHM": "HS256",
+        "MAIL_USERNAME": "bench@example.com",
+        "MAIL_PASSWORD": "bench",
+        # Spool emails without sending them
+        "NOTIFICATION_WORKERS": "0",
+        "NOTIFICATION_SPOOL_DIR": spool_dir,
+        # The stub accepts page tokens immediately
+        "GOOGLE_PAGE_TOKEN_DELAY_SECONDS": "0",
+        "RATING_RECONCILE_INTERVAL_MINUTES": "0",
+        "LOG_LEVEL": "WARNING",
+    }
+    for name, value in defaults.items():
+        env.setdefault(name, value)
+    return env
+
+
+def start_servers(args, spool_dir):
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.google_stub", "--port", str(args.stub_port),
+         "--latency-ms", str(args.google_latency_ms), "--jitter-ms", str(args.google_jitter_ms)],
+        cwd=REPO_ROOT,
+    )
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+         "--log-level", "warning"],
+        cwd=REPO_ROOT,
+        env=app_environment(args, spool_dir),
+    )
+    return [stub, app]
+
+def stop_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def wait_until_up(client, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/metrics")
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("App did not start in time")
+
+
+async def seed(client):
+    """
+    Create the benchmark user and give it some favorites.
+    Returns (user_id, token).
+    """
+    await client.post("/signup", json={"username": "bench", "password": BENCH_PASSWORD, "email": BENCH_EMAIL})
+    response = await client.post("/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    body = response.json()
+    user_id, token = body["result"]["user_id"], body.get("token")
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    response = await client.post(
+        "/maps/nearby_restaurants",
+        json={"location": LOCATIONS[0], "radius": RADIUS_MILES[0], "user_id": user_id},
+        headers=headers,
+    )
+    response.raise_for_status()
+    for restaurant in response.json()[:10]:
+        await client.post(
+            "/maps/add_favorite",
+            json={"user_id": user_id, "restaurant_id": restaurant["id"]},
+            headers=headers,
+        )
+    return user_id, token
+
+
+def scenario_request(name, user_id, token):
+    """
+    Return a function that sends the i-th request of a scenario.
+    """
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    run_id = uuid.uuid4().hex[:8]
+    fills = itertools.count()
+
+    def nearby(client, i):
+        # A few popular searches at different radii, served mostly from the cache
+        body = {
+            "location": LOCATIONS[i % len(LOCATIONS)],
+            "radius": RADIUS_MILES[i // len(LOCATIONS) % len(RADIUS_MILES)],
+            "user_id": user_id,
+        }
+        return client.post("/maps/nearby_restaurants", json=body, headers=headers)
+
+    def nearby_fill(client, i):
+        # Every request searches somewhere new, so each one geocodes and fills
+        # from Google. The keyword is unique too, so overlapping cells fetched
+        # earlier in the run don't turn a fill into a cache hit.
+        n = next(fills)
+        body = {
+            "location": f"{n} Benchmark Avenue {run_id}, New York",
+            "radius": RADIUS_MILES[n % len(RADIUS_MILES)],
+            "keyword": f"restaurant bench-{run_id}-{n}",
+            "user_id": user_id,
+        }
+        return client.post("/maps/nearby_restaurants", json=body, headers=headers)
+
+    def favorites(client, i):
+        return client.get(f"/maps/user_favorites/{user_id}", headers=headers)
+
+    def login(client, i):
+        return client.post("/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+
+    return {"nearby": nearby, "nearby_fill": nearby_fill, "favorites": favorites, "login": login}[name]
+
+
+async def drive(client, send, total, concurrency):
+    """
+    Send total requests from concurrency workers, each starting its next
+    request as soon as the previous one finishes.
+    Returns (latencies in seconds, error count, wall time in seconds).
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await send(client, i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, errors, wall_time):
+    latencies = sorted(latencies)
+    to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / wall_time, 2) if wall_time else None,
+        "mean_ms": to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": to_ms(percentile(latencies, 0.50)),
+        "p95_ms": to_ms(percentile(latencies, 0.95)),
+        "p99_ms": to_ms(percentile(latencies, 0.99)),
+        "max_ms": to_ms(latencies[-1]) if latencies else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(results, baseline=None):
+    print(f"{'scenario':<12}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, stats in results.items():
+        print(f"{name:<12}{stats['rps']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['errors']:>8}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            deltas = []
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+                if previous.get(key):
+                    deltas.append(f"{key} {100 * (stats[key] - previous[key]) / previous[key]:+.1f}%")
+            print(f"{'':<12}vs baseline: {', '.join(deltas)}")
+
+
+async def run(args):
+    base_url = args.base_url or f"http://127.0.0.1:{args.app_port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await wait_until_up(client)
+        user_id, token = await seed(client)
+
+        results = {}
+        for name in args.scenarios:
+            send = scenario_request(name, user_id, token)
+            await drive(client, send, args.warmup, args.concurrency)
+            latencies, errors, wall_time = await drive(client, send, args.requests, args.concurrency)
+            results[name] = summarize(latencies, errors, wall_time)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed-concurrency load test for the API")
+    parser.add_argument("--base-url", help="benchmark an already running app instead of starting one")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per scenario")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--app-port", type=int, default=8081)
+    parser.add_argument("--stub-port", type=int, default=8090)
+    parser.add_argument("--google-latency-ms", type=float, default=50.0)
+    parser.add_argument("--google-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--output", help="result file, defaults to benchmarks/results/<timestamp>.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    processes = []
+    with tempfile.TemporaryDirectory() as spool_dir:
+        if not args.base_url:
+            processes = start_servers(args, spool_dir)
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            stop_servers(processes)
+
+    report = {
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "google_latency_ms": args.google_latency_ms,
+            "google_jitter_ms": args.google_jitter_ms,
+            "base_url": args.base_url,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as result_file:
+        json.dump(report, result_file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    print_table(results, baseline)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
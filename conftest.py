@@ -0,0 +1,19 @@
+"""
+Test defaults for the required settings, so the suite runs without a .env file.
+Values already set in the environment win.
+"""
+import os
+
+_TEST_ENVIRONMENT = {
+    "GOOGLE_API_KEY": "test-key",
+    "ES_HOST": "http://localhost:9200",
+    "ES_USERNAME": "elastic",
+    "ES_PASSWORD": "test",
+    "SECRET_KEY": "test-secret-key-of-at-least-32-bytes",
+    "ALGORITHM": "HS256",
+    "MAIL_USERNAME": "test@example.com",
+    "MAIL_PASSWORD": "test",
+}
+
+for _name, _value in _TEST_ENVIRONMENT.items():
+    os.environ.setdefault(_name, _value)
@@ -0,0 +1,35 @@
+import os
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from helper.es_client import es_pool_state
+from helper.google_client import google_pool_state
+from helper.passwords import password_pool_state
+from helper import notification
+
+health_controller = APIRouter()
+
+
+@health_controller.get("/healthz", include_in_schema=False)
+async def healthz():
+    """
+    Liveness: the worker is up and serving requests.
+    """
+    return {"status": "ok", "pid": os.getpid()}
+
+@health_controller.get("/readyz", include_in_schema=False)
+async def readyz():
+    """
+    Readiness: Elasticsearch answers, plus the state of this worker's pools.
+    Returns 503 while Elasticsearch is unreachable.
+    """
+    elasticsearch = await es_pool_state()
+    ready = elasticsearch["reachable"]
+    body = {
+        "status": "ready" if ready else "unavailable",
+        "pid": os.getpid(),
+        "elasticsearch": elasticsearch,
+        "google": google_pool_state(),
+        "bcrypt": password_pool_state(),
+        "notifications": notification.get_dispatcher().state(),
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
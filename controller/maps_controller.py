@@ -1,20 +1,31 @@
 import datetime
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
-from flask import jsonify, request
-from pydantic import BaseModel
+import json
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from service import maps_service
-import server_properties
+from service import geocode_service
+from service import rating_service
+from helper.cache import get_cache_stats
+from helper.auth import authenticate, ensure_same_user
+from helper.projection import parse_fields, project
 import logger
-from datetime import timedelta
-import pytz
+import server_properties
 
 log = logger.get_logger()
 
-api_key = server_properties.GOOGLE_API_KEY
-log.info(f"api key loaded successfully")
-maps_controller = APIRouter(prefix="/maps")
+try:
+    import orjson
+
+    def _ndjson_line(row):
+        return orjson.dumps(row) + b"\n"
+except ImportError:
+    def _ndjson_line(row):
+        return (json.dumps(row) + "\n").encode("utf-8")
+
+# Bearer tokens are verified locally; the user is available through helper.auth.get_current_user
+maps_controller = APIRouter(prefix="/maps", dependencies=[Depends(authenticate)])
 
 # Request body models
 class LocationRequest(BaseModel):
@@ -22,6 +33,9 @@ class LocationRequest(BaseModel):
     radius: float
     keyword: str = "restaurant"
     user_id : str
+    sort: Literal["rating", "distance"] = "rating"
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None
 
 class CoordinatesRequest(BaseModel):
     latitude: float
@@ -43,40 +57,138 @@ class ReviewQueryRequest(BaseModel):
     restaurant_id: Optional[str] = None
     user_id: Optional[str] = None
 
+class RestaurantDetailsBatchRequest(BaseModel):
+    restaurant_ids: List[str]
+    user_id: Optional[str] = None
+
+class RatingSummaryRequest(BaseModel):
+    restaurant_ids: List[str] = Field(..., max_length=100)
+
+def paged_response(results, next_cursor, page_size, cursor, fields=None):
+    """
+    Wrap a page with its cursor when the client asked for pagination;
+    otherwise keep returning the plain list older clients expect.
+    fields projects every result down to the requested fields.
+    """
+    results = project(results, parse_fields(fields))
+    if page_size or cursor:
+        return {"results": results, "next_cursor": next_cursor}
+    return results
+
+async def ndjson_response(pages, fields=None):
+    """
+    Stream an async iterator of row lists as NDJSON, one row per line,
+    flushing each list as it arrives.
+    The first list is read before the response starts, so errors such as an
+    unknown location still get their status code. An error after that ends
+    the stream with an {"error": ...} line.
+    """
+    projection = parse_fields(fields)
+    try:
+        first_page = await pages.__anext__()
+    except StopAsyncIteration:
+        first_page = None
+
+    async def ndjson_lines():
+        if first_page is None:
+            return
+        try:
+            page = first_page
+            while True:
+                if page:
+                    yield b"".join(_ndjson_line(row) for row in project(page, projection))
+                page = await pages.__anext__()
+        except StopAsyncIteration:
+            return
+        except Exception as e:
+            log.error(f"Streaming response failed: {e}")
+            detail = e.detail if isinstance(e, HTTPException) else "Error while streaming results."
+            yield _ndjson_line({"error": detail})
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 @maps_controller.post("/nearby_restaurants")
-async def nearby_restaurants(request: Request, data: LocationRequest):
+async def nearby_restaurants(
+    request: Request,
+    data: LocationRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each result, e.g. id,name,rating"),
+):
     log.info(f"Finding restaurants near {data.location}...")
     if not data.location:
         raise HTTPException(status_code=400, detail="Location is required.")
     
-    # Fetch new nearby restaurants from Google API
-    restaurants = maps_service.find_nearby_restaurants(api_key, data.location, data.radius, data.user_id,data.keyword)
-    
-    if restaurants:
-        return restaurants
-    else:
-        return []
+    # Fetch nearby restaurants, filling the cache from Google API when needed
+    restaurants, next_cursor = await maps_service.find_nearby_restaurants(
+        data.location, data.radius, data.user_id, data.keyword,
+        sort=data.sort, page_size=data.page_size, cursor=data.cursor
+    )
+    return paged_response(restaurants, next_cursor, data.page_size, data.cursor, fields)
+
+@maps_controller.post("/nearby_restaurants/stream")
+async def nearby_restaurants_stream(
+    data: LocationRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each result, e.g. id,name,rating"),
+):
+    """
+    Stream nearby restaurants as NDJSON, one restaurant per line, flushed
+    page by page as Google returns them.
+    """
+    log.info(f"Streaming restaurants near {data.location}...")
+    if not data.location:
+        raise HTTPException(status_code=400, detail="Location is required.")
+
+    pages = maps_service.stream_nearby_restaurants(data.location, data.radius, data.user_id, data.keyword)
+    return await ndjson_response(pages, fields)
 
 @maps_controller.get("/restaurant_details/{restaurant_id}")
-async def restaurant_details(restaurant_id: str, user_id: Optional[str] = None):
+async def restaurant_details(
+    restaurant_id: str,
+    user_id: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return e.g. name,rating,address_parts.locality"),
+):
     log.info(f"Fetching details for restaurant ID: {restaurant_id}...")
     
     # Fetch restaurant details from the service
-    details = maps_service.get_restaurant_details(api_key, restaurant_id, user_id)
+    details = await maps_service.get_restaurant_details(restaurant_id, user_id)
     
-    return {'details': details}
+    return {'details': project(details, parse_fields(fields))}
+@maps_controller.post("/restaurant_details:batch")
+async def restaurant_details_batch(
+    data: RestaurantDetailsBatchRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each restaurant, e.g. name,rating,url"),
+):
+    log.info(f"Fetching details for {len(data.restaurant_ids)} restaurants...")
+    if len(data.restaurant_ids) > server_properties.DETAILS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {server_properties.DETAILS_BATCH_MAX_IDS} restaurant IDs can be requested at once."
+        )
+
+    # Resolved with one mget, misses fetched from Google concurrently
+    details = await maps_service.get_restaurant_details_for_ids(data.restaurant_ids, data.user_id)
+    missing = [restaurant_id for restaurant_id in dict.fromkeys(data.restaurant_ids) if restaurant_id not in details]
+
+    projection = parse_fields(fields)
+    details = {restaurant_id: project(restaurant, projection) for restaurant_id, restaurant in details.items()}
+    return {'details': details, 'missing': missing}
+
 @maps_controller.get("/restaurant_reviews/{restaurant_id}")
-async def restaurant_reviews(restaurant_id: str):
+async def restaurant_reviews(
+    restaurant_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each review, e.g. user_name,rating"),
+):
     log.info(f"Fetching reviews for restaurant ID: {restaurant_id}...")
     
     # Fetch restaurant details from the service
-    details = maps_service.fetch_restaurant_reviews(api_key, restaurant_id)
+    details = await maps_service.fetch_restaurant_reviews(restaurant_id)
+    details['reviews'] = project(details['reviews'], parse_fields(fields))
     
     return {'details': details}
 
 @maps_controller.post("/add_favorite")
 async def add_favorite(data: FavoriteRequest):
     log.info(f"Adding restaurant {data.restaurant_id} to favorites for user {data.user_id}...")
+    ensure_same_user(data.user_id)
     
     # Create favorite data
     favorite_data = {
@@ -87,19 +199,22 @@ async def add_favorite(data: FavoriteRequest):
     }
     
     # Store favorite in Elasticsearch
-    response = maps_service.store_user_favorite(favorite_data)
+    response = await maps_service.store_user_favorite(favorite_data)
     
     return {"message": "Favorite added successfully"}
 
 @maps_controller.get("/user_favorites/{user_id}")
-async def user_favorites(user_id: str):
+async def user_favorites(
+    user_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each result, e.g. id,name,rating"),
+):
     log.info(f"Fetching favorites for user ID: {user_id}...")
-    favorites = maps_service.fetch_user_favorites(user_id)
-    print("fav ",favorites)
+    favorites = await maps_service.fetch_user_favorites(user_id)
+    log.debug("Favorites: %s", favorites)
     if favorites==0:
         return []
     if favorites:
-        return favorites
+        return project(favorites, parse_fields(fields))
 
 @maps_controller.post("/add_review")
 async def add_review(data: ReviewRequest):
@@ -108,18 +223,11 @@ async def add_review(data: ReviewRequest):
     # Validate rating
     if data.rating < 1 or data.rating > 5:
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 5.")
-    
-    print(f"UTC Time: {datetime.datetime.utcnow().isoformat()}")
-    utc_now = datetime.datetime.utcnow()
-    print(utc_now)
-    new_york_tz = pytz.timezone("America/New_York")
-    ny_time = pytz.utc.localize(utc_now).astimezone(new_york_tz)
-    print(f"New York Time: {ny_time}")
-    print(f"new york time in ISO format {ny_time.isoformat()}")
+    ensure_same_user(data.user_id)
     
     try:
-        print("data",data)
-        response = maps_service.store_user_review(data.user_id,data.restaurant_id,data.rating,data.review_text)
+        log.debug("Review request: %s", data)
+        response = await maps_service.store_user_review(data.user_id,data.restaurant_id,data.rating,data.review_text)
         return {"message": "Review added successfully"}
     except Exception as e:
         log.error(f"Error storing review: {str(e)}")
@@ -129,6 +237,10 @@ async def add_review(data: ReviewRequest):
 async def get_user_reviews(
     restaurant_id: str = Query(None, description="The restaurant ID to fetch reviews for"),
     user_id: Optional[str] = Query(None, description="The user ID to fetch reviews by"),
+    sort: Literal["recency", "rating"] = Query("recency", description="Sort order of the reviews"),
+    page_size: Optional[int] = Query(None, description="Number of reviews per page"),
+    cursor: Optional[str] = Query(None, description="Cursor returned with the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each result, e.g. id,name,rating"),
 ):
     log.info("Fetching user reviews...")
     
@@ -140,30 +252,38 @@ async def get_user_reviews(
         # old method 
         #reviews = maps_service.fetch_reviews_by_restaurant(restaurant_id)
         # Call the service function to get the reviews along with restaurant details
-        reviews_with_details = maps_service.get_reviews_with_restaurant_details(restaurant_id, api_key)
-        
-        if reviews_with_details:
-            return reviews_with_details
-        else:
-            return []
+        reviews_with_details, next_cursor = await maps_service.get_reviews_with_restaurant_details(
+            restaurant_id, sort, page_size, cursor
+        )
+        return paged_response(reviews_with_details, next_cursor, page_size, cursor, fields)
+    except HTTPException:
+        raise
     except Exception as e:
         log.error(f"Error fetching reviews: {str(e)}")
         raise HTTPException(status_code=500, detail="An error occurred while fetching reviews.")
     
 @maps_controller.get("/user_reviews_by_user_id")
 async def get_user_reviews(
-    user_id: str = Query(..., description="The user ID to fetch reviews by")
+    user_id: str = Query(..., description="The user ID to fetch reviews by"),
+    sort: Literal["recency", "rating"] = Query("recency", description="Sort order of the reviews"),
+    page_size: Optional[int] = Query(None, description="Number of reviews per page"),
+    cursor: Optional[str] = Query(None, description="Cursor returned with the previous page"),
+    stream: bool = Query(False, description="Stream every review as NDJSON instead of returning one page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return for each result, e.g. id,name,rating"),
 ):
     log.info("Fetching user reviews...")
 
+    if stream:
+        return await ndjson_response(maps_service.stream_reviews_with_restaurant_details_for_user_id(user_id, sort), fields)
+
     try:
         # Call the service function to get reviews with restaurant details
-        reviews = maps_service.get_reviews_with_restaurant_details_for_user_id(user_id, api_key)
-
-        if reviews:
-            return reviews
-        else:
-            return []
+        reviews, next_cursor = await maps_service.get_reviews_with_restaurant_details_for_user_id(
+            user_id, sort, page_size, cursor
+        )
+        return paged_response(reviews, next_cursor, page_size, cursor, fields)
+    except HTTPException:
+        raise
     except Exception as e:
         log.error(f"Error fetching reviews: {str(e)}")
         raise HTTPException(status_code=500, detail="An error occurred while fetching reviews.")
@@ -182,7 +302,7 @@ async def reverse_geocode(request: Request):
             raise HTTPException(status_code=400, detail="Latitude and longitude are required.")
 
         # Perform reverse geocoding with your maps service
-        location = maps_service.reverse_geocode(latitude, longitude,api_key)
+        location = await geocode_service.reverse_geocode(latitude, longitude)
         
         # Return JSON response
         return JSONResponse(content={"location": location})
@@ -193,14 +313,15 @@ async def reverse_geocode(request: Request):
 @maps_controller.post("/remove_favorite")
 async def remove_favorite(data: FavoriteRequest):
     log.info(f"Removing restaurant {data.restaurant_id} from favorites for user {data.user_id}...")
+    ensure_same_user(data.user_id)
     
     # Generate the favorite_id based on user_id and restaurant_id
     favorite_id = f"{data.user_id}_{data.restaurant_id}"
     
     # Remove favorite from Elasticsearch
-    response = maps_service.remove_user_favorite(favorite_id)
+    response = await maps_service.remove_user_favorite(favorite_id, data.user_id)
 
-    print(response)
+    log.debug("Remove favorite response: %s", response)
     
     # Check if the response indicates that the favorite was successfully deleted
     if response.get('deleted', 0) == 1:
@@ -208,3 +329,13 @@ async def remove_favorite(data: FavoriteRequest):
     else:
         return {"message": "Favorite not found or could not be removed"}
 
+@maps_controller.post("/rating_summaries")
+async def rating_summaries(data: RatingSummaryRequest):
+    log.info(f"Fetching rating summaries for {len(data.restaurant_ids)} restaurants...")
+    summaries = await rating_service.get_rating_summaries(data.restaurant_ids)
+    # Empty IDs have no summary and are skipped
+    return [summaries[restaurant_id] for restaurant_id in dict.fromkeys(data.restaurant_ids) if restaurant_id in summaries]
+
+@maps_controller.get("/cache_stats")
+async def cache_stats():
+    return get_cache_stats()
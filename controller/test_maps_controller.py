@@ -0,0 +1,32 @@
+import asyncio
+from controller import maps_controller
+from controller.maps_controller import RatingSummaryRequest, paged_response
+
+
+ROWS = [
+    {"id": "a", "name": "A", "rating": 4.5, "address_parts": {"locality": "NYC"}},
+    {"id": "b", "name": "B", "rating": 4.0, "address_parts": {"locality": "Brooklyn"}},
+]
+
+def test_paged_response_keeps_the_plain_list_without_pagination():
+    assert paged_response(ROWS, None, None, None) == ROWS
+
+def test_paged_response_wraps_results_when_paginating():
+    assert paged_response(ROWS, "next", 2, None) == {"results": ROWS, "next_cursor": "next"}
+    assert paged_response(ROWS, None, None, "cursor") == {"results": ROWS, "next_cursor": None}
+
+def test_paged_response_projects_fields():
+    assert paged_response(ROWS, None, None, None, fields="id,address_parts.locality") == [
+        {"id": "a", "address_parts": {"locality": "NYC"}},
+        {"id": "b", "address_parts": {"locality": "Brooklyn"}},
+    ]
+
+def test_rating_summaries_skips_empty_ids(monkeypatch):
+    async def get_rating_summaries(restaurant_ids):
+        return {rid: {"restaurant_id": rid} for rid in restaurant_ids if rid}
+
+    monkeypatch.setattr(maps_controller.rating_service, "get_rating_summaries", get_rating_summaries)
+    request = RatingSummaryRequest(restaurant_ids=["a", "", "b", "a"])
+    assert asyncio.run(maps_controller.rating_summaries(request)) == [
+        {"restaurant_id": "a"}, {"restaurant_id": "b"}
+    ]
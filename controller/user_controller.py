@@ -45,23 +45,23 @@ user_service = UserService()
 
 @user_controller.post("/signup")
 async def signup(user: SignupModel):
-    result = user_service.signup(user.username, user.password, user.email)
+    result = await user_service.signup(user.username, user.password, user.email)
     if result.get("success"):
-        return {"message": "Signup successful", "user-id": result.get("user_id")}
+        return {"message": "Signup successful", "user-id": result.get("user_id"), "token": result.get("token")}
     else:
         raise HTTPException(status_code=400, detail=result.get("error"))
 
 @user_controller.post("/login")
 async def login(user: LoginModel):
-    result = user_service.login(user.email, user.password)
+    result = await user_service.login(user.email, user.password)
     if result.get("success"):
-        return {"message": "Login successful", "result": result.get('result')}
+        return {"message": "Login successful", "result": result.get('result'), "token": result.get("token")}
     else:
         raise HTTPException(status_code=401, detail=result.get("error"))
 
 @user_controller.put("/update")
 async def update(user: UpdateModel, user_id: str):
-    result = user_service.update_user(user_id, user.username, user.password)
+    result = await user_service.update_user(user_id, user.username, user.password)
     if result.get("success"):
         return {"message": "User updated successfully"}
     else:
@@ -69,7 +69,7 @@ async def update(user: UpdateModel, user_id: str):
     
 @user_controller.put("/change-password")
 async def update_password(request: UpdatePasswordModel):
-    result = user_service.update_password(request.email, request.old_password, request.new_password)
+    result = await user_service.update_password(request.email, request.old_password, request.new_password)
     if result.get("success"):
         return {"message": "Password updated successfully. A confirmation email has been sent."}
     else:
@@ -77,7 +77,7 @@ async def update_password(request: UpdatePasswordModel):
 
 @user_controller.post("/forgot-password")
 async def forgot_password(request: ForgotPasswordModel):
-    result = user_service.forgot_password(request.email)
+    result = await user_service.forgot_password(request.email)
     if result.get("success"):
         return {"message": result.get("message")}
     else:
@@ -85,7 +85,7 @@ async def forgot_password(request: ForgotPasswordModel):
     
 @user_controller.post("/submit-feedback")
 async def submit_feedback(request: SubmitFeedback):
-    result = user_service.submit_feedback(request.user_id,request.feedback)
+    result = await user_service.submit_feedback(request.user_id,request.feedback)
     if result.get("success"):
         return {"message": result.get("message")}
     else:
@@ -96,7 +96,7 @@ async def google_auth(request: GoogleLoginModel):
     """
     Handle Google Login or Signup.
     """
-    result = user_service.google_auth(request.email, request.sub, request.username)
+    result = await user_service.google_auth(request.email, request.sub, request.username)
     
     if result.get("success"):
         return {
@@ -0,0 +1,41 @@
+"""
+Production server settings: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn_conf.py app:app
+
+Every setting can be overridden with the environment variable named next to it.
+Send HUP to the master for a graceful reload: new workers start before the old
+ones finish their in-flight requests and exit.
+"""
+import multiprocessing
+import os
+
+# Async workers each use one core fully, so one worker per CPU
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Split the cores between workers for bcrypt too, instead of a full pool per worker
+os.environ.setdefault("BCRYPT_WORKERS", str(max(1, multiprocessing.cpu_count() // workers)))
+# Picks uvloop and httptools automatically when uvicorn[standard] is installed
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Longer than the load balancer's idle timeout, so the balancer closes idle connections first
+keepalive = int(os.environ.get("KEEPALIVE_SECONDS", "75"))
+timeout = int(os.environ.get("WORKER_TIMEOUT_SECONDS", "60"))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT_SECONDS", "30"))
+
+# Recycle workers now and then to bound memory growth; jitter avoids restarting all at once
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "1000"))
+
+# The app is imported in each worker after fork. The ES and Google clients,
+# the bcrypt pool and the logging thread are created lazily inside the worker,
+# so no sockets, event loops or threads are shared across processes.
+# The rating summary reconcile runs in one worker at a time, see RATING_RECONCILE_LOCK_FILE.
+preload_app = False
+
+# Heartbeat files on tmpfs; a disk-backed /tmp can stall workers in containers
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "*")
+accesslog = None
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info").lower()
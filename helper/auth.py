@@ -0,0 +1,87 @@
+import datetime
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import lru_cache
+from typing import Optional
+import jwt
+from jwt.algorithms import get_default_algorithms
+from fastapi import Header, HTTPException
+import server_properties
+import logger
+
+log = logger.get_logger()
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    user_id: str
+    username: Optional[str] = None
+
+
+# The authenticated user of the request being handled, None for anonymous calls
+current_user: ContextVar[Optional[AuthUser]] = ContextVar("current_user", default=None)
+
+
+@lru_cache(maxsize=1)
+def _signing_key():
+    """
+    Prepare the signing key once per process instead of on every encode/decode.
+    """
+    return get_default_algorithms()[server_properties.ALGORITHM].prepare_key(server_properties.SECRET_KEY)
+
+def create_access_token(user_id: str, username: str = None):
+    """
+    Create an access token carrying user_id and username as claims.
+    """
+    expires = datetime.datetime.utcnow() + timedelta(minutes=server_properties.ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode = {"user_id": user_id, "username": username, "exp": expires}
+    return jwt.encode(to_encode, _signing_key(), algorithm=server_properties.ALGORITHM)
+
+def decode_access_token(token: str) -> AuthUser:
+    """
+    Verify the token's signature and expiry locally and return its user.
+    Raises 401 for invalid or expired tokens.
+    """
+    try:
+        claims = jwt.decode(
+            token,
+            _signing_key(),
+            algorithms=[server_properties.ALGORITHM],
+            options={"require": ["exp", "user_id"]},
+        )
+    except jwt.PyJWTError as e:
+        log.info(f"Rejected access token: {e}")
+        raise HTTPException(status_code=401, detail="Invalid or expired token.", headers={"WWW-Authenticate": "Bearer"})
+    return AuthUser(user_id=claims["user_id"], username=claims.get("username"))
+
+
+async def authenticate(authorization: Optional[str] = Header(None)):
+    """
+    Router dependency that validates an optional "Authorization: Bearer <token>"
+    header and stores the user in current_user for the rest of the request.
+    Requests without a token stay anonymous unless AUTH_REQUIRED is set.
+    """
+    if not authorization:
+        if server_properties.AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Not authenticated.", headers={"WWW-Authenticate": "Bearer"})
+        current_user.set(None)
+        return None
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header.", headers={"WWW-Authenticate": "Bearer"})
+    user = decode_access_token(token.strip())
+    current_user.set(user)
+    return user
+
+def get_current_user() -> Optional[AuthUser]:
+    return current_user.get()
+
+def ensure_same_user(user_id: str):
+    """
+    Reject the request when an authenticated caller acts on another user's data.
+    """
+    user = get_current_user()
+    if user and user.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Token does not belong to this user.")
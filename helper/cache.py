@@ -0,0 +1,176 @@
+import asyncio
+import time
+from collections import OrderedDict
+import server_properties
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire ttl seconds after being set.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_stats_registry = {}
+
+
+class CacheStats:
+    """
+    Hit/miss counters for a named cache, registered so they can be reported together.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        _stats_registry[name] = self
+
+    def record_hit(self, count=1):
+        self.hits += count
+
+    def record_miss(self, count=1):
+        self.misses += count
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hit_ratio, 4)}
+
+
+def get_cache_stats():
+    return {name: stats.as_dict() for name, stats in _stats_registry.items()}
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one in-flight task.
+    Callers that arrive while a task is running await its result instead of
+    starting their own, and cancelling one caller does not cancel the shared work.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, func):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def running(self, key):
+        """
+        Return the in-flight task for a key, or None when nothing is running.
+        """
+        return self._inflight.get(key)
+
+    def __len__(self):
+        return len(self._inflight)
+
+
+class ReadThroughCache:
+    """
+    Two-tier read-through cache.
+    L1 is a bounded in-process TTL/LRU cache; on a miss the loader runs (the
+    L2 Elasticsearch lookup and, behind it, the upstream API) and its result is
+    kept in L1. Concurrent misses for the same key share one loader call.
+    Falsy results are not cached so failures are retried on the next request.
+    Without maxsize/ttl, L1 is sized from server_properties.CACHE_NAMESPACES
+    on first use, so building the cache at import reads no settings.
+    """
+
+    def __init__(self, namespace, loader, maxsize=None, ttl=None):
+        self.namespace = namespace
+        self.loader = loader
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._l1 = None
+        self.stats = CacheStats(f"{namespace}_l1")
+        self._flights = SingleFlight()
+
+    @property
+    def l1(self):
+        if self._l1 is None:
+            if self._maxsize is None or self._ttl is None:
+                settings = server_properties.CACHE_NAMESPACES[self.namespace]
+                self._maxsize = self._maxsize or settings['maxsize']
+                self._ttl = self._ttl or settings['ttl']
+            self._l1 = TTLCache(self._maxsize, self._ttl)
+        return self._l1
+
+    def get_cached(self, key):
+        value = self.l1.get(key, _MISSING)
+        if value is _MISSING:
+            self.stats.record_miss()
+            return None
+        self.stats.record_hit()
+        return value
+
+    async def get(self, key):
+        value = self.get_cached(key)
+        if value is not None:
+            return value
+        return await self.load(key)
+
+    async def load(self, key, loader=None):
+        """
+        Run the loader for a key that missed L1, sharing the call with any
+        concurrent loads of the same key.
+        """
+        return await self._flights.do(key, lambda: self._load(key, loader or self.loader))
+
+    async def _load(self, key, loader):
+        value = await loader(key)
+        if value:
+            self.l1.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.l1.set(key, value)
+
+    def invalidate(self, key):
+        self.l1.invalidate(key)
+
+
+def read_through_cache(namespace, loader):
+    """
+    Build a ReadThroughCache using the size/TTL configured for the namespace
+    in server_properties.CACHE_NAMESPACES.
+    """
+    return ReadThroughCache(namespace, loader)
@@ -5,4 +5,6 @@ RESTAURANT_REVIEWS="restaurant_reviews"
 USER_REVIEWS="user_reviews"
 USER_INDEX="users"
 RESTAURANT_DETAILS= "restaurants_details"
-
+NEARBY_SEARCH_TILES="nearby_search_tiles"
+GEOCODE_CACHE="geocode_cache"
+RESTAURANT_RATING_SUMMARY="restaurant_rating_summary"
@@ -0,0 +1,102 @@
+import asyncio
+from elastic_transport import AiohttpHttpNode
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk
+import server_properties
+import logger
+from helper.metrics import span
+
+log = logger.get_logger()
+
+_es_client = None
+
+
+def _es_operation(target):
+    """
+    Metric label for a request target: the last API segment of the path
+    ("/users/_doc/abc" -> "_doc", "/_bulk" -> "_bulk"), or "index" for index-level calls.
+    """
+    segments = [segment for segment in target.split("?", 1)[0].split("/") if segment.startswith("_")]
+    return segments[-1] if segments else "index"
+
+
+class TimedAiohttpNode(AiohttpHttpNode):
+    """
+    Connection node that records the latency of every Elasticsearch request,
+    whichever client call, helper or namespace issued it.
+    """
+
+    async def perform_request(self, method, target, *args, **kwargs):
+        with span("elasticsearch", f"{method} {_es_operation(target)}"):
+            return await super().perform_request(method, target, *args, **kwargs)
+
+
+def get_es():
+    """
+    Return the process-wide AsyncElasticsearch client, creating it on first use.
+    Every service and router shares this client and its connection pool.
+    """
+    global _es_client
+    if _es_client is None:
+        _es_client = AsyncElasticsearch(
+            hosts=[server_properties.ES_HOST],
+            basic_auth=(server_properties.ES_USER, server_properties.ES_PASSWORD),
+            connections_per_node=server_properties.ES_MAX_CONNECTIONS,
+            request_timeout=server_properties.ES_REQUEST_TIMEOUT_SECONDS,
+            max_retries=server_properties.ES_MAX_RETRIES,
+            retry_on_timeout=server_properties.ES_RETRY_ON_TIMEOUT,
+            node_class=TimedAiohttpNode,
+        )
+        log.info(f"Created Elasticsearch client (pool size {server_properties.ES_MAX_CONNECTIONS})")
+    return _es_client
+
+
+async def es_pool_state():
+    """
+    Readiness view of the Elasticsearch client: its pool settings and whether
+    the cluster answers a ping.
+    """
+    es = get_es()
+    try:
+        reachable = await es.ping()
+    except Exception:
+        reachable = False
+    return {
+        "reachable": reachable,
+        "nodes": len(es.transport.node_pool.all()),
+        "connections_per_node": server_properties.ES_MAX_CONNECTIONS,
+    }
+
+
+async def close_es():
+    global _es_client
+    if _es_client is not None:
+        await _es_client.close()
+        _es_client = None
+
+
+async def bulk_in_chunks(actions, chunk_size=None, max_concurrency=None, refresh=None):
+    """
+    Send bulk actions in chunks of chunk_size, with up to max_concurrency
+    chunk requests in flight at once.
+    Returns (success_count, errors) summed over all chunks; item errors are
+    collected instead of raised. refresh is passed through to each bulk request.
+    """
+    chunk_size = chunk_size or server_properties.ES_BULK_CHUNK_SIZE
+    max_concurrency = max_concurrency or server_properties.ES_BULK_CONCURRENCY
+    actions = list(actions)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def send(chunk):
+        async with semaphore:
+            options = {"refresh": refresh} if refresh else {}
+            return await async_bulk(get_es(), chunk, chunk_size=chunk_size, raise_on_error=False, **options)
+
+    chunks = [actions[i:i + chunk_size] for i in range(0, len(actions), chunk_size)]
+    results = await asyncio.gather(*(send(chunk) for chunk in chunks))
+
+    success = sum(count for count, _ in results)
+    errors = [error for _, chunk_errors in results for error in chunk_errors]
+    if errors:
+        log.warning(f"Bulk request finished with {len(errors)} failed items, first: {errors[0]}")
+    return success, errors
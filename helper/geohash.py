@@ -0,0 +1,148 @@
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+def encode(latitude, longitude, precision):
+    """
+    Encode a coordinate into a geohash string of the given precision.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits = bits << 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def cell_size(precision):
+    """
+    Return the (latitude, longitude) size in degrees of a geohash cell.
+    """
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def haversine_meters(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance between two coordinates in meters.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _circle_span(latitude, radius_meters):
+    lat_span = radius_meters / METERS_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    lng_span = min(radius_meters / (METERS_PER_DEGREE_LAT * cos_lat), 180.0)
+    return lat_span, lng_span
+
+
+def _cell_meters(latitude, precision):
+    cell_lat, cell_lng = cell_size(precision)
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    return cell_lat * METERS_PER_DEGREE_LAT, cell_lng * METERS_PER_DEGREE_LAT * cos_lat
+
+
+def _cell_ranges(latitude, longitude, lat_span, lng_span, precision):
+    # Row and column indices of the cells overlapping the circle's bounding box
+    cell_lat, cell_lng = cell_size(precision)
+    rows_total = round(180.0 / cell_lat)
+    cols_total = round(360.0 / cell_lng)
+    first_row = max(int(math.floor((latitude - lat_span + 90.0) / cell_lat)), 0)
+    last_row = min(int(math.floor((latitude + lat_span + 90.0) / cell_lat)), rows_total - 1)
+    first_col = int(math.floor((longitude - lng_span + 180.0) / cell_lng))
+    last_col = int(math.floor((longitude + lng_span + 180.0) / cell_lng))
+    if last_col - first_col + 1 >= cols_total:
+        cols = range(cols_total)
+    else:
+        cols = sorted({col % cols_total for col in range(first_col, last_col + 1)})
+    return range(first_row, last_row + 1), cols
+
+
+def _distance_to_cell(latitude, longitude, south, west, cell_lat, cell_lng):
+    # Distance from the point to the nearest point of the cell
+    nearest_lat = min(max(latitude, south), south + cell_lat)
+    # Longitude offset of the point from the cell's west edge, wrapped into [-180, 180)
+    offset = (longitude - west + 180.0) % 360.0 - 180.0
+    if offset < 0 or offset > cell_lng:
+        # Outside the cell's columns: the nearest edge is west or east, whichever is closer around the globe
+        to_west = -offset if offset < 0 else 360.0 - offset
+        to_east = offset - cell_lng if offset > cell_lng else offset - cell_lng + 360.0
+        nearest_lng = west if to_west <= to_east else west + cell_lng
+    else:
+        nearest_lng = longitude
+    return haversine_meters(latitude, longitude, nearest_lat, nearest_lng)
+
+
+def covering_cells(latitude, longitude, radius_meters, max_cells=64, max_precision=7):
+    """
+    Return (precision, cells) where cells are every geohash cell that
+    intersects the search circle.
+
+    Cells are never larger than the radius, so a cell marked fresh by one
+    search always lies close to that search's circle. Within that bound the
+    finest precision whose bounding-box cover fits max_cells is used; when
+    even the coarsest allowed precision needs more cells, it is used anyway.
+    """
+    lat_span, lng_span = _circle_span(latitude, radius_meters)
+
+    # Coarsest precision whose cells fit inside the radius in both directions
+    coarsest = max_precision
+    for candidate in range(1, max_precision + 1):
+        height, width = _cell_meters(latitude, candidate)
+        if height <= radius_meters and width <= radius_meters:
+            coarsest = candidate
+            break
+
+    precision = coarsest
+    for candidate in range(max_precision, coarsest, -1):
+        rows, cols = _cell_ranges(latitude, longitude, lat_span, lng_span, candidate)
+        if len(rows) * len(cols) <= max_cells:
+            precision = candidate
+            break
+
+    cell_lat, cell_lng = cell_size(precision)
+    rows, cols = _cell_ranges(latitude, longitude, lat_span, lng_span, precision)
+    cells = {encode(latitude, longitude, precision)}
+    for row in rows:
+        south = row * cell_lat - 90.0
+        for col in cols:
+            west = col * cell_lng - 180.0
+            if _distance_to_cell(latitude, longitude, south, west, cell_lat, cell_lng) <= radius_meters:
+                cells.add(encode(south + cell_lat / 2, west + cell_lng / 2, precision))
+
+    return precision, sorted(cells)
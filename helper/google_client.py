@@ -0,0 +1,120 @@
+import asyncio
+import httpx
+import server_properties
+import logger
+from helper.metrics import span
+
+log = logger.get_logger()
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class GoogleMapsClient:
+    """
+    Async client for the Google Maps web services.
+    All calls share one pooled keep-alive httpx client, so a worker can keep
+    many requests to Google in flight without opening a connection per call.
+    """
+
+    def __init__(self, api_key, max_connections=100, timeout=10.0, keepalive_expiry=30.0):
+        self.api_key = api_key
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+
+    async def _get(self, url, params, operation):
+        with span("google", operation):
+            response = await self.client.get(url, params={**params, 'key': self.api_key})
+        log.info("Google API %s responded with %s (%s)", url, response.status_code, response.http_version)
+        return response
+
+    async def geocode(self, address):
+        return await self._get(server_properties.GOOGLE_GEOCODE_API_BASE_URL, {'address': address}, "geocode")
+
+    async def reverse_geocode(self, latitude, longitude):
+        return await self._get(server_properties.GOOGLE_GEOCODE_API_BASE_URL, {'latlng': f"{latitude},{longitude}"}, "reverse_geocode")
+
+    async def nearby_search(self, location, radius, keyword='restaurant'):
+        params = {'location': location, 'radius': radius, 'keyword': keyword}
+        return await self._get(server_properties.GOOGLE_PLACES_API_BASE_URL, params, "nearby_search")
+
+    async def iter_nearby_pages(self, location, radius, keyword='restaurant', max_pages=3, token_delay=2.0):
+        """
+        Yield the response for each page of a nearby search, following
+        next_page_token for up to max_pages pages.
+        Google only accepts a page token a short while after issuing it, so
+        each follow-up waits token_delay seconds and retries while the token
+        is still reported as INVALID_REQUEST.
+        """
+        response = await self.nearby_search(location, radius, keyword)
+        pages = 1
+        while True:
+            yield response
+            if response.status_code != 200:
+                return
+            page_token = response.json().get('next_page_token')
+            if not page_token or pages >= max_pages:
+                return
+            for _ in range(3):
+                await asyncio.sleep(token_delay)
+                response = await self._get(server_properties.GOOGLE_PLACES_API_BASE_URL, {'pagetoken': page_token}, "nearby_search_page")
+                if response.status_code != 200 or response.json().get('status') != 'INVALID_REQUEST':
+                    break
+            pages += 1
+
+    async def place_details(self, place_id):
+        return await self._get(server_properties.GOOGLE_PLACE_DETAILS_API_BASE_URL, {'place_id': place_id}, "place_details")
+
+    def pool_state(self):
+        # httpx keeps its connection pool private; report counts when the transport exposes them
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        state = {"http2": HTTP2_AVAILABLE, "closed": self.client.is_closed}
+        if connections is not None:
+            state["open_connections"] = len(connections)
+            state["idle_connections"] = sum(1 for connection in connections if connection.is_idle())
+        return state
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_google_client = None
+
+
+def get_google_client():
+    """
+    Return the process-wide Google Maps client, creating it on first use.
+    """
+    global _google_client
+    if _google_client is None:
+        _google_client = GoogleMapsClient(
+            server_properties.GOOGLE_API_KEY,
+            max_connections=server_properties.GOOGLE_HTTP_MAX_CONNECTIONS,
+            timeout=server_properties.GOOGLE_HTTP_TIMEOUT_SECONDS,
+        )
+        log.info(f"Created Google Maps client (http2={HTTP2_AVAILABLE})")
+    return _google_client
+
+
+def google_pool_state():
+    if _google_client is None:
+        return {"created": False}
+    return {"created": True, "max_connections": server_properties.GOOGLE_HTTP_MAX_CONNECTIONS, **_google_client.pool_state()}
+
+
+async def close_google_client():
+    global _google_client
+    if _google_client is not None:
+        await _google_client.aclose()
+        _google_client = None
@@ -0,0 +1,138 @@
+from elasticsearch import BadRequestError
+from helper import constants
+from helper.es_client import get_es
+import logger
+
+log = logger.get_logger()
+
+# Exact-match identifier. The .keyword sub-field keeps queries written against
+# the old dynamic mappings (e.g. "user_id.keyword") working on new indices.
+KEYWORD = {"type": "keyword", "fields": {"keyword": {"type": "keyword"}}}
+# Free text that is also sortable/aggregatable, same shape as the dynamic default
+TEXT = {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+DATE = {"type": "date"}
+FLOAT = {"type": "float"}
+# Stored only, never searched
+STORED = {"type": "keyword", "index": False, "doc_values": False}
+
+INDEX_MAPPINGS = {
+    constants.USER_INDEX: {
+        "user_id": KEYWORD,
+        "email": KEYWORD,
+        "username": TEXT,
+        "password": STORED,
+        "created_at": DATE,
+    },
+    constants.FEEDBACK_INDEX: {
+        "user_id": KEYWORD,
+        "feedback": {"type": "text"},
+        "created_at": DATE,
+    },
+    constants.RESTAURANTS_INDEX: {
+        "id": KEYWORD,
+        "name": TEXT,
+        "address": TEXT,
+        "rating": FLOAT,
+        "latitude": FLOAT,
+        "longitude": FLOAT,
+        "location": {"type": "geo_point"},
+        "photo_url": STORED,
+        "search_keywords": {"type": "keyword"},
+        "search_tiles": {"type": "keyword"},
+        "fetched_at": DATE,
+    },
+    constants.USER_FAVORITES: {
+        "favorite_id": KEYWORD,
+        "user_id": KEYWORD,
+        "restaurant_id": KEYWORD,
+        "added_at": DATE,
+    },
+    constants.RESTAURANT_REVIEWS: {
+        "restaurant_id": KEYWORD,
+        "user_id": KEYWORD,
+        "rating": FLOAT,
+    },
+    constants.USER_REVIEWS: {
+        "review_id": KEYWORD,
+        "user_id": KEYWORD,
+        "restaurant_id": KEYWORD,
+        "rating": FLOAT,
+        "review_text": {"type": "text"},
+        "created_at": DATE,
+        "author_name": TEXT,
+    },
+    constants.RESTAURANT_DETAILS: {
+        "place_id": KEYWORD,
+        "name": TEXT,
+        "cached_at": DATE,
+    },
+    constants.NEARBY_SEARCH_TILES: {
+        "geohash": {"type": "keyword"},
+        "precision": {"type": "integer"},
+        "search_keyword": {"type": "keyword"},
+        "radius_meters": FLOAT,
+        "complete": {"type": "boolean"},
+        "fetched_at": DATE,
+    },
+    constants.GEOCODE_CACHE: {
+        "kind": {"type": "keyword"},
+        "key": {"type": "keyword"},
+        "latitude": FLOAT,
+        "longitude": FLOAT,
+        "formatted_address": {"type": "text"},
+        "cached_at": DATE,
+    },
+    constants.RESTAURANT_RATING_SUMMARY: {
+        "restaurant_id": KEYWORD,
+        "count": {"type": "long"},
+        "sum": {"type": "double"},
+        "histogram": {"type": "object"},
+        "updated_at": DATE,
+    },
+}
+
+_indices_ready = False
+
+
+async def ensure_indices():
+    """
+    Install an index template for every index in helper/constants.py and make
+    sure each index exists with its explicit mapping.
+
+    New indices are created from their template. Existing indices only get
+    the fields they do not map yet, since Elasticsearch cannot change the type
+    of a mapped field in place; fields mapped with a different type are logged
+    and need a reindex. Runs once per process.
+    """
+    global _indices_ready
+    if _indices_ready:
+        return
+    es = get_es()
+    for index_name, properties in INDEX_MAPPINGS.items():
+        await es.indices.put_index_template(
+            name=f"{index_name}-template",
+            index_patterns=[index_name],
+            template={"mappings": {"properties": properties}},
+            priority=100,
+        )
+        if not await es.indices.exists(index=index_name):
+            await es.options(ignore_status=400).indices.create(index=index_name)
+            log.info(f"Created index {index_name}")
+            continue
+
+        response = await es.indices.get_mapping(index=index_name)
+        existing = next(iter(response.values()))['mappings'].get('properties', {})
+        missing = {field: mapping for field, mapping in properties.items() if field not in existing}
+        for field in properties:
+            if field in existing and existing[field].get('type', 'object') != properties[field].get('type', 'object'):
+                log.warning(
+                    f"Index {index_name} maps {field} as {existing[field].get('type', 'object')}, "
+                    f"expected {properties[field].get('type', 'object')}; reindex to apply the new mapping."
+                )
+        if missing:
+            try:
+                await es.indices.put_mapping(index=index_name, properties=missing)
+                log.info(f"Added {sorted(missing)} to the {index_name} mapping")
+            except BadRequestError as e:
+                log.warning(f"Could not extend the {index_name} mapping: {e}")
+    _indices_ready = True
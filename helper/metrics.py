@@ -0,0 +1,127 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from helper.cache import get_cache_stats
+import logger
+
+log = logger.get_logger()
+
+# Latency buckets in seconds, from fast cache reads up to slow upstream calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_histograms = []
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with one series per combination of label values,
+    rendered in the Prometheus text format. Safe to observe from worker threads.
+    """
+
+    def __init__(self, name, description, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        _histograms.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = [(labels, dict(series, buckets=list(series["buckets"]))) for labels, series in self._series.items()]
+        for label_values, series in sorted(series_items):
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, label_values))
+            for bound, count in zip(self.buckets, series["buckets"]):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series['sum']}")
+            lines.append(f"{self.name}_count{{{labels}}} {series['count']}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of API requests by route and status.",
+    ("method", "route", "status"),
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_request_duration_seconds",
+    "Latency of calls to Google, Elasticsearch, SMTP and bcrypt.",
+    ("dependency", "operation", "outcome"),
+)
+
+
+@contextmanager
+def span(dependency, operation):
+    """
+    Time the enclosed call to a dependency and record it in DEPENDENCY_LATENCY.
+    Works around awaited calls as well as blocking ones.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        DEPENDENCY_LATENCY.observe(elapsed, dependency, operation, outcome)
+        log.debug("%s %s %s in %.1f ms", dependency, operation, outcome, elapsed * 1000)
+
+
+async def metrics_middleware(request, call_next):
+    """
+    Give every request an ID (taken from X-Request-ID when the caller sends one)
+    that is attached to its log lines and echoed in the response, and record
+    the request latency per route.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = logger.request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        # Label by route template, not raw path, so path parameters don't explode the series
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            request.method,
+            route.path if route else "unmatched",
+            str(status),
+        )
+        logger.request_id_var.reset(token)
+
+
+def render_metrics():
+    """
+    All latency histograms and cache counters in the Prometheus text format.
+    """
+    lines = []
+    for histogram in _histograms:
+        lines.extend(histogram.render())
+
+    cache_stats = get_cache_stats()
+    for metric, key in (("cache_hits_total", "hits"), ("cache_misses_total", "misses")):
+        lines.append(f"# TYPE {metric} counter")
+        for name, stats in sorted(cache_stats.items()):
+            lines.append(f'{metric}{{cache="{name}"}} {stats[key]}')
+    return "\n".join(lines) + "\n"
@@ -1,32 +1,318 @@
+import asyncio
+import datetime
+import json
 import smtplib
+import uuid
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 import sys
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # Add the project root to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import server_properties
+import logger
+from helper.metrics import span
 
+log = logger.get_logger()
 
-def send_notification(subject, body, to_email):
+
+def build_message(subject, body, to_email):
     msg = MIMEMultipart()
     msg['From'] = server_properties.MAIL_USERNAME
     msg['To'] = to_email
     msg['Subject'] = subject
     msg.attach(MIMEText(body, 'plain'))
-    print(msg.as_string())
+    return msg
 
-    try:
+def open_smtp_connection():
+    with span("smtp", "connect"):
         server = smtplib.SMTP(server_properties.MAIL_HOST, server_properties.MAIL_PORT)
         if server_properties.MAIL_USE_TLS:
             server.starttls()
-        server.login(server_properties.MAIL_USERNAME, server_properties.MAIL_PASSWORD)
+        if server_properties.MAIL_USE_AUTH:
+            server.login(server_properties.MAIL_USERNAME, server_properties.MAIL_PASSWORD)
+    return server
+
+def send_notification(subject, body, to_email):
+    """
+    Send one email synchronously over a fresh SMTP connection.
+    Request handlers should use enqueue_notification instead.
+    """
+    msg = build_message(subject, body, to_email)
+    log.debug(msg.as_string())
+
+    try:
+        server = open_smtp_connection()
         server.sendmail(server_properties.MAIL_USERNAME, to_email, msg.as_string())
         server.quit()
-        print("Notification sent successfully.")
+        log.info("Notification sent successfully.")
     except Exception as e:
-        print(f"Failed to send notification: {e}")
+        log.error(f"Failed to send notification: {e}")
+
+
+def _try_lock(path):
+    """
+    Take a non-blocking exclusive flock on path and return the open file, or
+    None when another live process holds it. The lock is released when the
+    file is closed or the process dies, whatever its PID is reused for later.
+    """
+    lock_file = open(path, "a")
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class NotificationDispatcher:
+    """
+    Background email delivery.
+
+    enqueue() writes the message to a spool file and returns immediately.
+    Worker tasks drain the queue in batches, each over its own long-lived SMTP
+    connection, so handlers never wait on SMTP handshakes. Failed sends are
+    retried with exponential backoff. After max_attempts only the message
+    metadata is kept in the failed/ spool folder; bodies can hold one-time
+    passwords, so they are dropped. Spool files are readable by the owner only.
+    Each process spools into its own owner-* folder and holds a flock on it.
+    On start, folders whose lock is free belong to a process that died; their
+    messages are moved into this process's folder with atomic renames, so
+    accepted messages survive restarts and are claimed by one process only.
+    """
+
+    def __init__(self, spool_dir, workers=2, batch_size=20, max_attempts=5, retry_base_seconds=5.0, idle_close_seconds=60.0):
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.idle_close_seconds = idle_close_seconds
+        self.queue = asyncio.Queue()
+        self._tasks = []
+        self.owner_dir = None
+        self._owner_lock = None
+
+    async def start(self):
+        os.makedirs(self.failed_dir, mode=0o700, exist_ok=True)
+        self._claim_owner_dir()
+        self._scrub_failed()
+        recovered = self._recover_spool()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        log.info(f"Notification dispatcher started with {self.workers} workers, {recovered} spooled messages recovered.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Messages still spooled are picked up by the next process that starts
+        if self._owner_lock is not None:
+            self._owner_lock.close()
+            self._owner_lock = None
+            self.owner_dir = None
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    def state(self):
+        return {"running": self.running, "workers": len(self._tasks), "queued": self.queue.qsize()}
+
+    def enqueue(self, subject, body, to_email):
+        message = {
+            "id": uuid.uuid4().hex,
+            "subject": subject,
+            "body": body,
+            "to_email": to_email,
+            "attempts": 0
+        }
+        self._write_spool(message)
+        self.queue.put_nowait(message)
+
+    def _claim_owner_dir(self):
+        if self._owner_lock is not None:
+            return
+        owner_dir = os.path.join(self.spool_dir, f"owner-{uuid.uuid4().hex}")
+        os.makedirs(owner_dir, mode=0o700)
+        self._owner_lock = _try_lock(os.path.join(owner_dir, ".lock"))
+        self.owner_dir = owner_dir
+
+    def _spool_path(self, message_id, folder=None):
+        return os.path.join(folder or self.owner_dir, f"{message_id}.json")
+
+    def _write_spool(self, message, folder=None):
+        if folder is None:
+            self._claim_owner_dir()
+        folder = folder or self.owner_dir
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        path = self._spool_path(message["id"], folder)
+        # Messages can carry secrets such as password reset codes
+        fd = os.open(f"{path}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w") as spool_file:
+            json.dump(message, spool_file)
+        os.replace(f"{path}.tmp", path)
+
+    def _scrub_failed(self):
+        # Drop bodies from failed messages written before they were scrubbed on failure
+        for name in os.listdir(self.failed_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.failed_dir, name)
+            try:
+                with open(path) as spool_file:
+                    message = json.load(spool_file)
+                if "body" in message:
+                    message.pop("body")
+                    self._write_spool(message, self.failed_dir)
+                else:
+                    os.chmod(path, 0o600)
+            except (OSError, ValueError):
+                continue
+
+    def _recover_spool(self):
+        recovered = 0
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            if name.endswith(".json"):
+                # Written directly into spool_dir by versions before owner folders
+                recovered += self._claim_message(path)
+            elif name.startswith("owner-") and path != self.owner_dir:
+                recovered += self._recover_owner_dir(path)
+        return recovered
+
+    def _recover_owner_dir(self, owner_dir):
+        lock_path = os.path.join(owner_dir, ".lock")
+        try:
+            lock_file = _try_lock(lock_path)
+        except OSError:
+            return 0
+        if lock_file is None:
+            # The owner is still running
+            return 0
+        recovered = 0
+        try:
+            for name in os.listdir(owner_dir):
+                if name.endswith(".json"):
+                    recovered += self._claim_message(os.path.join(owner_dir, name))
+                elif name.endswith(".tmp"):
+                    os.remove(os.path.join(owner_dir, name))
+            os.remove(lock_path)
+            os.rmdir(owner_dir)
+        except OSError:
+            pass
+        finally:
+            lock_file.close()
+        return recovered
+
+    def _claim_message(self, path):
+        # The rename is atomic, so a message is claimed by exactly one process
+        claimed_path = os.path.join(self.owner_dir, os.path.basename(path))
+        try:
+            os.rename(path, claimed_path)
+            with open(claimed_path) as spool_file:
+                message = json.load(spool_file)
+            os.chmod(claimed_path, 0o600)
+        except (OSError, ValueError):
+            return 0
+        self.queue.put_nowait(message)
+        return 1
+
+    async def _worker(self):
+        connection = None
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(self.queue.get(), timeout=self.idle_close_seconds)
+                except asyncio.TimeoutError:
+                    # Close idle connections before the server drops them
+                    connection = await asyncio.to_thread(self._close, connection)
+                    continue
+
+                batch = [message]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                for message in batch:
+                    try:
+                        connection = await asyncio.to_thread(self._send, connection, message)
+                        os.remove(self._spool_path(message["id"]))
+                        log.info(f"Notification {message['id']} sent.")
+                    except Exception as e:
+                        connection = await asyncio.to_thread(self._close, connection)
+                        self._schedule_retry(message, e)
+        finally:
+            self._close(connection)
+
+    def _send(self, connection, message):
+        msg = build_message(message["subject"], message["body"], message["to_email"])
+        if connection is None:
+            connection = open_smtp_connection()
+        try:
+            with span("smtp", "sendmail"):
+                connection.sendmail(server_properties.MAIL_USERNAME, message["to_email"], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # The kept-alive connection was dropped, reconnect once
+            connection = open_smtp_connection()
+            with span("smtp", "sendmail"):
+                connection.sendmail(server_properties.MAIL_USERNAME, message["to_email"], msg.as_string())
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        if connection is not None:
+            try:
+                connection.quit()
+            except Exception:
+                pass
+        return None
+
+    def _schedule_retry(self, message, error):
+        message["attempts"] += 1
+        if message["attempts"] >= self.max_attempts:
+            log.error(f"Giving up on notification {message['id']} after {message['attempts']} attempts: {error}")
+            # Keep a record of what failed, without the body
+            failed = {key: value for key, value in message.items() if key != "body"}
+            failed.update(error=str(error), failed_at=datetime.datetime.utcnow().isoformat())
+            self._write_spool(failed, self.failed_dir)
+            os.remove(self._spool_path(message["id"]))
+            return
+        delay = self.retry_base_seconds * 2 ** (message["attempts"] - 1)
+        log.warning(f"Notification {message['id']} failed ({error}), retrying in {delay}s.")
+        self._write_spool(message)
+        asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, message)
+
+
+_dispatcher = None
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = NotificationDispatcher(
+            server_properties.NOTIFICATION_SPOOL_DIR,
+            workers=server_properties.NOTIFICATION_WORKERS,
+            batch_size=server_properties.NOTIFICATION_BATCH_SIZE,
+            max_attempts=server_properties.NOTIFICATION_MAX_ATTEMPTS,
+            retry_base_seconds=server_properties.NOTIFICATION_RETRY_BASE_SECONDS,
+            idle_close_seconds=server_properties.NOTIFICATION_IDLE_CLOSE_SECONDS,
+        )
+    return _dispatcher
+
+def enqueue_notification(subject, body, to_email):
+    """
+    Queue an email for background delivery and return immediately.
+    """
+    get_dispatcher().enqueue(subject, body, to_email)
 
 # Main method for testing
 if __name__ == "__main__":
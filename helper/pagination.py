@@ -0,0 +1,69 @@
+import base64
+import binascii
+import json
+from elasticsearch import NotFoundError
+from fastapi import HTTPException
+import server_properties
+from helper.es_client import get_es
+
+
+def encode_cursor(pit_id, search_after):
+    state = json.dumps({"pit": pit_id, "search_after": search_after}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(state.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return state["pit"], state["search_after"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def clamp_page_size(page_size, default):
+    if not page_size:
+        return default
+    return max(1, min(page_size, server_properties.MAX_PAGE_SIZE))
+
+
+async def search_page(index, query, sort, page_size, cursor=None, paginate=True, source=None):
+    """
+    Run one page of a sorted search and return (hits, next_cursor).
+
+    With paginate=True the first page opens a point-in-time and every page
+    continues from the previous page's sort values with search_after, so pages
+    stay consistent while the index changes. The cursor carries the PIT id and
+    the last sort values; it is None once the results are exhausted.
+    With paginate=False this is a single bounded search and next_cursor is None.
+    """
+    es = get_es()
+    if not paginate:
+        response = await es.search(index=index, query=query, sort=sort, size=page_size, source=source)
+        return response['hits']['hits'], None
+
+    keep_alive = server_properties.PIT_KEEP_ALIVE
+    if cursor:
+        pit_id, search_after = decode_cursor(cursor)
+    else:
+        pit = await es.open_point_in_time(index=index, keep_alive=keep_alive)
+        pit_id, search_after = pit['id'], None
+
+    search_kwargs = {
+        "query": query,
+        "sort": sort,
+        "size": page_size,
+        "source": source,
+        "pit": {"id": pit_id, "keep_alive": keep_alive},
+        "track_total_hits": False,
+    }
+    if search_after:
+        search_kwargs["search_after"] = search_after
+    try:
+        response = await es.search(**search_kwargs)
+    except NotFoundError:
+        raise HTTPException(status_code=400, detail="Cursor has expired, start again from the first page.")
+
+    hits = response['hits']['hits']
+    pit_id = response.get('pit_id', pit_id)
+    if len(hits) < page_size:
+        await es.options(ignore_status=404).close_point_in_time(id=pit_id)
+        return hits, None
+    return hits, encode_cursor(pit_id, hits[-1]['sort'])
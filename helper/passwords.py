@@ -0,0 +1,92 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from fastapi import HTTPException
+import server_properties
+import logger
+from helper.metrics import span
+
+log = logger.get_logger()
+
+_executor = None
+_pending = 0
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+def _verify(stored_hash, password):
+    return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+
+
+def get_password_executor():
+    """
+    Return the process pool that runs bcrypt, creating it on first use.
+    Workers are spawned rather than forked so they never inherit the event
+    loop or open client sockets of the parent.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=server_properties.BCRYPT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        log.info(f"Created password hashing pool ({server_properties.BCRYPT_WORKERS} workers)")
+    return _executor
+
+def shutdown_password_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def password_pool_state():
+    return {
+        "created": _executor is not None,
+        "workers": server_properties.BCRYPT_WORKERS,
+        "pending": _pending,
+        "max_pending": server_properties.BCRYPT_MAX_PENDING,
+    }
+
+
+async def _run(operation, func, *args):
+    """
+    Run func on the password pool. Rejects with 503 instead of queueing
+    without bound once BCRYPT_MAX_PENDING calls are already waiting.
+    """
+    global _pending
+    if _pending >= server_properties.BCRYPT_MAX_PENDING:
+        log.warning(f"Password hashing queue full ({_pending} pending), rejecting request.")
+        raise HTTPException(status_code=503, detail="Server is busy, please try again shortly.", headers={"Retry-After": "1"})
+    _pending += 1
+    try:
+        # Includes time spent queued for a free worker, which is what callers wait for
+        with span("bcrypt", operation):
+            return await asyncio.get_running_loop().run_in_executor(get_password_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    """
+    Hash the password using bcrypt at the configured BCRYPT_ROUNDS cost
+    """
+    return await _run("hash", _hash, password, server_properties.BCRYPT_ROUNDS)
+
+async def verify_password(stored_hash: str, password: str) -> bool:
+    """
+    Verify the password with the stored hashed password
+    """
+    return await _run("verify", _verify, stored_hash, password)
+
+def needs_rehash(stored_hash: str) -> bool:
+    """
+    True when the stored hash was made with a different cost than BCRYPT_ROUNDS.
+    bcrypt hashes look like $2b$<cost>$<salt+hash>.
+    """
+    try:
+        return int(stored_hash.split('$')[2]) != server_properties.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
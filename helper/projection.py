@@ -0,0 +1,34 @@
+def parse_fields(fields):
+    """
+    Parse a fields= query value such as "id,name,address_parts.locality" into
+    a projection tree: {"id": None, "name": None, "address_parts": {"locality": None}}.
+    None marks a field that is kept whole. Returns None when nothing is selected.
+    """
+    if not fields:
+        return None
+    tree = {}
+    for path in fields.split(","):
+        parts = [part.strip() for part in path.split(".") if part.strip()]
+        node = tree
+        for i, part in enumerate(parts):
+            if i == len(parts) - 1:
+                node[part] = None
+            elif part in node and node[part] is None:
+                # The parent is already selected whole
+                break
+            else:
+                node = node.setdefault(part, {})
+    return tree or None
+
+def project(value, tree):
+    """
+    Keep only the selected fields of a dict, or of every dict in a list.
+    Builds new containers and never mutates value, which may be shared with a cache.
+    """
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
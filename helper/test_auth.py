@@ -0,0 +1,56 @@
+import asyncio
+import datetime
+import jwt
+import pytest
+from fastapi import HTTPException
+from helper import auth
+
+
+def test_access_token_round_trip():
+    token = auth.create_access_token("ana@example.com", "ana")
+    assert auth.decode_access_token(token) == auth.AuthUser(user_id="ana@example.com", username="ana")
+
+def test_expired_token_is_rejected_with_401():
+    expired = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+    token = jwt.encode({"user_id": "ana@example.com", "exp": expired}, auth._signing_key(), algorithm=auth.server_properties.ALGORITHM)
+    with pytest.raises(HTTPException) as error:
+        auth.decode_access_token(token)
+    assert error.value.status_code == 401
+
+@pytest.mark.parametrize("token", [
+    "not-a-token",
+    jwt.encode({"user_id": "ana@example.com", "exp": 4102444800}, "another-key-of-at-least-32-bytes-long", algorithm="HS256"),
+    jwt.encode({"user_id": "ana@example.com"}, "unused-key-of-at-least-32-bytes-long", algorithm="HS256"),
+])
+def test_invalid_token_is_rejected_with_401(token):
+    with pytest.raises(HTTPException) as error:
+        auth.decode_access_token(token)
+    assert error.value.status_code == 401
+
+def test_authenticate_sets_current_user():
+    token = auth.create_access_token("ana@example.com")
+
+    async def run():
+        user = await auth.authenticate(f"Bearer {token}")
+        return user, auth.get_current_user()
+
+    user, current = asyncio.run(run())
+    assert user == current == auth.AuthUser(user_id="ana@example.com")
+
+def test_authenticate_rejects_non_bearer_header():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(auth.authenticate("Basic abc"))
+    assert error.value.status_code == 401
+
+def test_ensure_same_user_rejects_other_users_with_403():
+    reset = auth.current_user.set(auth.AuthUser(user_id="ana@example.com"))
+    try:
+        auth.ensure_same_user("ana@example.com")
+        with pytest.raises(HTTPException) as error:
+            auth.ensure_same_user("bob@example.com")
+        assert error.value.status_code == 403
+    finally:
+        auth.current_user.reset(reset)
+
+def test_ensure_same_user_allows_anonymous_callers():
+    auth.ensure_same_user("bob@example.com")
@@ -0,0 +1,108 @@
+import asyncio
+from helper import cache
+from helper.cache import ReadThroughCache, SingleFlight, TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    assert ttl_cache.get("a") == 1
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+    assert len(ttl_cache) == 2
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    ttl_cache = TTLCache(maxsize=10, ttl=5)
+    ttl_cache.set("a", 1)
+    now[0] += 4
+    assert ttl_cache.get("a") == 1
+    now[0] += 2
+    assert ttl_cache.get("a", "missing") == "missing"
+    assert len(ttl_cache) == 0
+
+def test_ttl_cache_invalidate_and_clear():
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.invalidate("a")
+    assert ttl_cache.get("a") is None
+    ttl_cache.clear()
+    assert len(ttl_cache) == 0
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("key", load) for _ in range(5)))
+        assert len(flights) == 0
+        return results
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+
+def test_single_flight_cancelled_caller_does_not_cancel_the_work():
+    async def load():
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        flights = SingleFlight()
+        first = asyncio.ensure_future(flights.do("key", load))
+        second = asyncio.ensure_future(flights.do("key", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "value"
+
+def test_single_flight_propagates_errors_and_forgets_the_key():
+    async def fail():
+        raise ValueError("boom")
+
+    async def main():
+        flights = SingleFlight()
+        try:
+            await flights.do("key", fail)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expected ValueError")
+        return flights.running("key")
+
+    assert asyncio.run(main()) is None
+
+def test_read_through_cache_keeps_loaded_values_in_l1():
+    loads = []
+
+    async def loader(key):
+        loads.append(key)
+        return {"id": key}
+
+    read_through = ReadThroughCache("test_read_through", loader, maxsize=10, ttl=60)
+    assert asyncio.run(read_through.get("a")) == {"id": "a"}
+    assert asyncio.run(read_through.get("a")) == {"id": "a"}
+    assert loads == ["a"]
+    assert (read_through.stats.hits, read_through.stats.misses) == (1, 1)
+
+def test_read_through_cache_does_not_keep_falsy_results():
+    loads = []
+
+    async def loader(key):
+        loads.append(key)
+        return {}
+
+    read_through = ReadThroughCache("test_read_through_empty", loader, maxsize=10, ttl=60)
+    asyncio.run(read_through.get("missing"))
+    asyncio.run(read_through.get("missing"))
+    assert loads == ["missing", "missing"]
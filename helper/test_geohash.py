@@ -0,0 +1,55 @@
+import math
+import random
+from helper import geohash
+
+
+def test_encode_known_values():
+    assert geohash.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash.encode(40.7128, -74.0060, 5) == "dr5re"
+    assert geohash.encode(-33.8688, 151.2093, 6) == "r3gx2f"
+
+def test_encode_prefixes_match_across_precisions():
+    full = geohash.encode(51.5074, -0.1278, 9)
+    for precision in range(1, 9):
+        assert geohash.encode(51.5074, -0.1278, precision) == full[:precision]
+
+def test_covering_cells_are_no_larger_than_the_radius():
+    for radius in (1609.34, 3 * 1609.34, 5 * 1609.34, 80000):
+        precision, _ = geohash.covering_cells(40.7128, -74.0060, radius)
+        height, width = geohash._cell_meters(40.7128, precision)
+        assert height <= radius and width <= radius
+
+def test_covering_cells_includes_the_center_cell():
+    precision, cells = geohash.covering_cells(40.7128, -74.0060, 1609.34)
+    assert geohash.encode(40.7128, -74.0060, precision) in cells
+    assert cells == sorted(set(cells))
+
+def test_covering_cells_has_no_gaps():
+    rng = random.Random(7)
+    for _ in range(100):
+        latitude, longitude = rng.uniform(-70, 70), rng.uniform(-180, 180)
+        radius = rng.choice((500, 1609.34, 8046.7, 40000))
+        precision, cells = geohash.covering_cells(latitude, longitude, radius)
+        cells = set(cells)
+        for _ in range(100):
+            distance = radius * math.sqrt(rng.random())
+            bearing = rng.uniform(0, 2 * math.pi)
+            point_lat = latitude + distance * math.cos(bearing) / geohash.METERS_PER_DEGREE_LAT
+            point_lng = longitude + distance * math.sin(bearing) / (
+                geohash.METERS_PER_DEGREE_LAT * math.cos(math.radians(latitude))
+            )
+            point_lng = (point_lng + 180.0) % 360.0 - 180.0
+            if geohash.haversine_meters(latitude, longitude, point_lat, point_lng) > radius:
+                continue
+            assert geohash.encode(point_lat, point_lng, precision) in cells
+
+def test_covering_cells_wraps_the_antimeridian():
+    precision, cells = geohash.covering_cells(10.0, 179.99, 5000)
+    assert geohash.encode(10.0, 179.99, precision) in cells
+    assert geohash.encode(10.0, -179.99, precision) in cells
+
+def test_covering_cells_excludes_cells_outside_the_circle():
+    latitude, longitude, radius = 40.7128, -74.0060, 1609.34
+    precision, cells = geohash.covering_cells(latitude, longitude, radius)
+    far_away = geohash.encode(latitude + 3 * radius / geohash.METERS_PER_DEGREE_LAT, longitude, precision)
+    assert far_away not in cells
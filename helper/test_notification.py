@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import stat
+from helper.notification import NotificationDispatcher
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+def _spooled(folder):
+    return sorted(name for name in os.listdir(folder) if name.endswith(".json"))
+
+def _write_message(folder, message):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f"{message['id']}.json"), "w") as spool_file:
+        json.dump(message, spool_file)
+
+
+def test_enqueue_spools_messages_readable_by_the_owner_only(tmp_path):
+    async def main():
+        dispatcher = NotificationDispatcher(str(tmp_path / "spool"), workers=0)
+        await dispatcher.start()
+        dispatcher.enqueue("Reset code", "Your code is 123456", "user@example.com")
+        message = dispatcher.queue.get_nowait()
+        path = dispatcher._spool_path(message["id"])
+        assert _mode(path) == 0o600
+        assert _mode(dispatcher.owner_dir) == 0o700
+        await dispatcher.stop()
+
+    asyncio.run(main())
+
+def test_giving_up_keeps_metadata_without_the_body(tmp_path):
+    async def main():
+        dispatcher = NotificationDispatcher(str(tmp_path / "spool"), workers=0, max_attempts=2, retry_base_seconds=60)
+        await dispatcher.start()
+        dispatcher.enqueue("Reset code", "Your code is 123456", "user@example.com")
+        message = dispatcher.queue.get_nowait()
+
+        dispatcher._schedule_retry(message, Exception("connection refused"))
+        assert message["attempts"] == 1
+        assert _spooled(dispatcher.owner_dir) == [f"{message['id']}.json"]
+
+        dispatcher._schedule_retry(message, Exception("connection refused"))
+        assert _spooled(dispatcher.owner_dir) == []
+        failed_path = os.path.join(dispatcher.failed_dir, f"{message['id']}.json")
+        with open(failed_path) as failed_file:
+            failed = json.load(failed_file)
+        assert "body" not in failed
+        assert failed["to_email"] == "user@example.com"
+        assert failed["attempts"] == 2 and failed["error"] == "connection refused"
+        assert _mode(failed_path) == 0o600
+        await dispatcher.stop()
+
+    asyncio.run(main())
+
+def test_start_scrubs_bodies_from_old_failed_messages(tmp_path):
+    spool_dir = tmp_path / "spool"
+    _write_message(str(spool_dir / "failed"), {"id": "old", "subject": "Reset code", "body": "123456"})
+
+    async def main():
+        dispatcher = NotificationDispatcher(str(spool_dir), workers=0)
+        await dispatcher.start()
+        await dispatcher.stop()
+
+    asyncio.run(main())
+    with open(spool_dir / "failed" / "old.json") as failed_file:
+        assert json.load(failed_file) == {"id": "old", "subject": "Reset code"}
+
+def test_messages_of_a_dead_owner_are_recovered_once(tmp_path):
+    spool_dir = str(tmp_path / "spool")
+    # Owner folder without a lock holder, as left by a process that died
+    _write_message(os.path.join(spool_dir, "owner-dead"), {"id": "m1", "subject": "s", "body": "b", "to_email": "a@b.c", "attempts": 0})
+    # Written by a version that spooled directly into spool_dir
+    _write_message(spool_dir, {"id": "m2", "subject": "s", "body": "b", "to_email": "a@b.c", "attempts": 0})
+
+    async def main():
+        first = NotificationDispatcher(spool_dir, workers=0)
+        await first.start()
+        second = NotificationDispatcher(spool_dir, workers=0)
+        await second.start()
+        claimed = sorted(first.queue.get_nowait()["id"] for _ in range(first.queue.qsize()))
+        assert claimed == ["m1", "m2"]
+        assert second.queue.qsize() == 0
+        assert _spooled(first.owner_dir) == ["m1.json", "m2.json"]
+        assert not os.path.exists(os.path.join(spool_dir, "owner-dead"))
+        await first.stop()
+        await second.stop()
+
+    asyncio.run(main())
+
+def test_messages_of_a_running_owner_are_left_alone(tmp_path):
+    spool_dir = str(tmp_path / "spool")
+
+    async def main():
+        running = NotificationDispatcher(spool_dir, workers=0)
+        await running.start()
+        running.enqueue("s", "b", "a@b.c")
+
+        starting = NotificationDispatcher(spool_dir, workers=0)
+        await starting.start()
+        assert starting.queue.qsize() == 0
+        assert len(_spooled(running.owner_dir)) == 1
+
+        # Once the owner stops, its spooled messages are picked up on the next start
+        await running.stop()
+        restarted = NotificationDispatcher(spool_dir, workers=0)
+        await restarted.start()
+        assert restarted.queue.qsize() == 1
+        await starting.stop()
+        await restarted.stop()
+
+    asyncio.run(main())
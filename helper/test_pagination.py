@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from helper import pagination
+from helper.pagination import clamp_page_size, decode_cursor, encode_cursor, search_page
+
+
+class FakePagingES:
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.searches = []
+        self.closed = []
+
+    def options(self, **kwargs):
+        return self
+
+    async def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit-1"}
+
+    async def close_point_in_time(self, id):
+        self.closed.append(id)
+
+    async def search(self, **kwargs):
+        self.searches.append(kwargs)
+        return {"pit_id": "pit-1", "hits": {"hits": self.pages.pop(0)}}
+
+
+def _hits(*sort_values):
+    return [{"_source": {"rank": value}, "sort": [value]} for value in sort_values]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("pit-id", [4.5, "ChIJ-place"])
+    assert decode_cursor(cursor) == ("pit-id", [4.5, "ChIJ-place"])
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor("a" * 50 + "+/?", [1, 2, 3])
+    assert all(char.isalnum() or char in "-_=" for char in cursor)
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30=", encode_cursor("pit", [])[:-4] + "@@@@"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+def test_clamp_page_size():
+    assert clamp_page_size(None, 20) == 20
+    assert clamp_page_size(0, 20) == 20
+    assert clamp_page_size(-5, 20) == 1
+    assert clamp_page_size(10 ** 6, 20) == pagination.server_properties.MAX_PAGE_SIZE
+
+def test_search_page_walks_a_point_in_time(monkeypatch):
+    es = FakePagingES([_hits(1, 2), _hits(3)])
+    monkeypatch.setattr(pagination, "get_es", lambda: es)
+
+    hits, cursor = asyncio.run(search_page("index", {"match_all": {}}, [{"rank": "asc"}], 2))
+    assert [hit["sort"] for hit in hits] == [[1], [2]]
+    assert decode_cursor(cursor) == ("pit-1", [2])
+
+    hits, cursor = asyncio.run(search_page("index", {"match_all": {}}, [{"rank": "asc"}], 2, cursor=cursor))
+    assert [hit["sort"] for hit in hits] == [[3]]
+    assert cursor is None
+    assert es.searches[1]["search_after"] == [2]
+    assert es.closed == ["pit-1"]
+
+def test_search_page_without_pagination_is_one_bounded_search(monkeypatch):
+    es = FakePagingES([_hits(1, 2)])
+    monkeypatch.setattr(pagination, "get_es", lambda: es)
+
+    hits, cursor = asyncio.run(search_page("index", {"match_all": {}}, [], 2, paginate=False))
+    assert len(hits) == 2 and cursor is None
+    assert "pit" not in es.searches[0]
@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from helper import passwords
+
+
+@pytest.mark.parametrize("stored_hash, rehash", [
+    ("$2b$12$" + "a" * 53, False),
+    ("$2b$10$" + "a" * 53, True),
+    ("$2b$14$" + "a" * 53, True),
+    ("not-a-bcrypt-hash", True),
+    ("", True),
+])
+def test_needs_rehash_compares_the_cost_with_bcrypt_rounds(monkeypatch, stored_hash, rehash):
+    monkeypatch.setenv("BCRYPT_ROUNDS", "12")
+    passwords.server_properties.get_settings.cache_clear()
+    try:
+        assert passwords.needs_rehash(stored_hash) is rehash
+    finally:
+        passwords.server_properties.get_settings.cache_clear()
+
+def test_hash_and_verify_round_trip():
+    stored_hash = passwords._hash("correct horse", 4)
+    assert stored_hash.startswith("$2b$04$")
+    assert passwords._verify(stored_hash, "correct horse")
+    assert not passwords._verify(stored_hash, "wrong horse")
+
+def test_full_queue_is_rejected_with_503(monkeypatch):
+    monkeypatch.setattr(passwords, "_pending", passwords.server_properties.BCRYPT_MAX_PENDING)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(passwords.verify_password("$2b$04$" + "a" * 53, "password"))
+    assert error.value.status_code == 503
+    assert error.value.headers == {"Retry-After": "1"}
@@ -0,0 +1,32 @@
+from helper.projection import parse_fields, project
+
+
+def test_parse_fields_builds_a_tree():
+    assert parse_fields("id,name,address_parts.locality") == {
+        "id": None, "name": None, "address_parts": {"locality": None}
+    }
+
+def test_parse_fields_empty_selects_everything():
+    assert parse_fields(None) is None
+    assert parse_fields("") is None
+    assert parse_fields(" , ") is None
+
+def test_parse_fields_whole_parent_wins():
+    assert parse_fields("address_parts,address_parts.locality") == {"address_parts": None}
+
+def test_project_keeps_selected_fields_of_every_item():
+    rows = [
+        {"id": "a", "name": "A", "rating": 4.5, "address_parts": {"locality": "NYC", "country": "US"}},
+        {"id": "b", "name": "B"},
+    ]
+    tree = parse_fields("id,address_parts.locality")
+    assert project(rows, tree) == [{"id": "a", "address_parts": {"locality": "NYC"}}, {"id": "b"}]
+
+def test_project_does_not_mutate_the_input():
+    row = {"id": "a", "name": "A", "address_parts": {"locality": "NYC", "country": "US"}}
+    project(row, parse_fields("address_parts.locality"))
+    assert row == {"id": "a", "name": "A", "address_parts": {"locality": "NYC", "country": "US"}}
+
+def test_project_without_a_tree_returns_the_value():
+    row = {"id": "a"}
+    assert project(row, None) is row
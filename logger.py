@@ -1,11 +1,34 @@
+import atexit
 import logging.config
+import logging.handlers
+import os
+import queue
 import sys
+from contextvars import ContextVar
+
+# ID of the request being handled, set by the metrics middleware
+request_id_var = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        # Records handed over by the queue handler already carry the caller's request ID
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
 log_config = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'simple': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            'format': '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+        },
+    },
+    'filters': {
+        'request_id': {
+            '()': RequestIdFilter,
         },
     },
     'handlers': {
@@ -13,13 +36,14 @@ log_config = {
             'class': 'logging.StreamHandler',
             'level': 'DEBUG',
             'formatter': 'simple',
+            'filters': ['request_id'],
             'stream': 'ext://sys.stdout'
         },
     },
     'loggers': {
         '': {
             'handlers': ['console'],
-            'level': 'INFO',
+            'level': os.environ.get('LOG_LEVEL', 'INFO').upper(),
             'propagate': True
         }
     }
@@ -27,6 +51,48 @@ log_config = {
 
 logging.config.dictConfig(log_config)
 
+_listener = None
+_console_handlers = []
+
+
+def start_queue_logging():
+    """
+    Hand records to a background thread so writing to stdout never blocks the
+    event loop. Called by the server on startup; until then, and in processes
+    that never call it such as the bcrypt pool, records go straight to the console.
+    The request ID is captured by the queue handler, in the context of the logging call.
+    """
+    global _listener, _console_handlers
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    _console_handlers = list(root.handlers)
+    for handler in _console_handlers:
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    root.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *_console_handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_queue_logging)
+
+def stop_queue_logging():
+    """
+    Flush queued records and log directly to the console again.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            root.removeHandler(handler)
+    for handler in _console_handlers:
+        root.addHandler(handler)
+
 # Handling case where __file__ is not set
 if hasattr(sys.modules['__main__'], '__file__'):
     name = str(sys.modules['__main__'].__file__).split("/")[-1].split('.')[0]
@@ -0,0 +1,23 @@
+import asyncio
+from helper.es_client import close_es
+from helper.index_mappings import ensure_indices
+from service.user_service import UserService
+
+
+async def main():
+    try:
+        await ensure_indices()
+        result = await UserService().migrate_legacy_users()
+        print(f"Migrated {result['migrated']} users, {len(result['failed'])} failed.")
+        for email, doc_ids in result['collisions'].items():
+            print(f"Duplicate accounts for {email}: {', '.join(doc_ids)}")
+        if result['failed'] or result['collisions']:
+            print("Resolve these and run again before setting USERS_LEGACY_LOOKUP=false.")
+    finally:
+        await close_es()
+
+# Re-key users created before user documents were keyed by email.
+# Until this has run cleanly and USERS_LEGACY_LOOKUP is set to false, login
+# and signup still search for legacy users before the keyed get/create.
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,34 +1,186 @@
+"""
+Application settings, read from the environment (and .env) on first use.
+
+Nothing is read at import time. get_settings() loads and validates every
+setting once per process and reports all missing variables together.
+Module attributes such as server_properties.ES_HOST resolve to the
+matching Settings field, so callers don't need to change.
+"""
 import os
+import tempfile
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Dict
 from dotenv import load_dotenv
 import logger
 
-load_dotenv()
 log = logger.get_logger()
 
+_REQUIRED = object()
 
-def get_env_variable(var_name):
-    try:
-        log.info(f"{var_name}: {os.environ[var_name]}")
-        return os.environ[var_name]
-    except KeyError:
-        error_msg = "Set the %s environment variable" % var_name
-        raise Exception(error_msg)
-log.info("loaded variables successfully ")
-
-GOOGLE_API_KEY = get_env_variable('GOOGLE_API_KEY')
-GOOGLE_PLACES_API_BASE_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-GOOGLE_GEOCODE_API_BASE_URL = 'https://maps.googleapis.com/maps/api/geocode/json'
-ES_HOST = get_env_variable('ES_HOST')
-ES_USER = get_env_variable('ES_USERNAME')
-ES_PASSWORD = get_env_variable('ES_PASSWORD')
-SECRET_KEY = get_env_variable('SECRET_KEY')
-ALGORITHM = get_env_variable('ALGORITHM')
-# Email configuration
-MAIL_HOST = 'smtp.gmail.com'
-MAIL_PORT = 587
-MAIL_USERNAME = get_env_variable('MAIL_USERNAME')  # Replace with your method of securely getting the email
-MAIL_PASSWORD = get_env_variable('MAIL_PASSWORD')  # Replace with your method of securely getting the password
-MAIL_USE_TLS = True
-MAIL_USE_AUTH = True
 
+def _flag(value):
+    return value.lower() in ('1', 'true', 'yes')
+
+def env_setting(env_name, default=_REQUIRED, cast=str, secret=False):
+    """
+    Declare a Settings field read from env_name. Fields without a default are
+    required; secret fields are left out of the repr so they never reach logs.
+    """
+    return field(repr=not secret, metadata={"env": env_name, "default": default, "cast": cast})
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Google Maps
+    google_api_key: str = env_setting('GOOGLE_API_KEY', secret=True)
+    # Override to point the Google clients at a stand-in, e.g. the benchmark stub
+    google_maps_api_root: str = env_setting('GOOGLE_MAPS_API_ROOT', 'https://maps.googleapis.com')
+    google_http_max_connections: int = env_setting('GOOGLE_HTTP_MAX_CONNECTIONS', 100, int)
+    google_http_timeout_seconds: float = env_setting('GOOGLE_HTTP_TIMEOUT_SECONDS', 10.0, float)
+    google_max_concurrent_requests: int = env_setting('GOOGLE_MAX_CONCURRENT_REQUESTS', 8, int)
+    google_page_token_delay_seconds: float = env_setting('GOOGLE_PAGE_TOKEN_DELAY_SECONDS', 2.0, float)
+
+    # Nearby search cache configuration
+    nearby_cache_ttl_hours: float = env_setting('NEARBY_CACHE_TTL_HOURS', 24, float)
+    nearby_cache_max_cells: int = env_setting('NEARBY_CACHE_MAX_CELLS', 64, int)
+    nearby_cache_max_results: int = env_setting('NEARBY_CACHE_MAX_RESULTS', 100, int)
+    nearby_max_pages: int = env_setting('NEARBY_MAX_PAGES', 3, int)
+    restaurant_details_max_age_hours: float = env_setting('RESTAURANT_DETAILS_MAX_AGE_HOURS', 24, float)
+
+    # In-process (L1) cache sizes and TTLs per namespace
+    cache_restaurant_details_size: int = env_setting('CACHE_RESTAURANT_DETAILS_SIZE', 5000, int)
+    cache_restaurant_details_ttl_seconds: float = env_setting('CACHE_RESTAURANT_DETAILS_TTL_SECONDS', 300, float)
+    cache_geocode_size: int = env_setting('CACHE_GEOCODE_SIZE', 10000, int)
+    cache_geocode_ttl_seconds: float = env_setting('CACHE_GEOCODE_TTL_SECONDS', 3600, float)
+    cache_reverse_geocode_size: int = env_setting('CACHE_REVERSE_GEOCODE_SIZE', 10000, int)
+    cache_reverse_geocode_ttl_seconds: float = env_setting('CACHE_REVERSE_GEOCODE_TTL_SECONDS', 3600, float)
+
+    # Persistent geocode cache
+    geocode_cache_ttl_days: float = env_setting('GEOCODE_CACHE_TTL_DAYS', 30, float)
+    geocode_reverse_precision: int = env_setting('GEOCODE_REVERSE_PRECISION', 4, int)
+
+    # Listings and pagination
+    reviews_max_results: int = env_setting('REVIEWS_MAX_RESULTS', 100, int)
+    max_page_size: int = env_setting('MAX_PAGE_SIZE', 100, int)
+    pit_keep_alive: str = env_setting('PIT_KEEP_ALIVE', '2m')
+    rating_reconcile_interval_minutes: float = env_setting('RATING_RECONCILE_INTERVAL_MINUTES', 60, float)
+    # Only the worker holding this lock runs the reconcile; share the path between workers on one host
+    rating_reconcile_lock_file: str = env_setting(
+        'RATING_RECONCILE_LOCK_FILE', os.path.join(tempfile.gettempdir(), 'rating_reconcile.lock')
+    )
+    details_batch_max_ids: int = env_setting('DETAILS_BATCH_MAX_IDS', 50, int)
+    favorites_max_results: int = env_setting('FAVORITES_MAX_RESULTS', 500, int)
+    favorite_ids_cache_size: int = env_setting('FAVORITE_IDS_CACHE_SIZE', 10000, int)
+    # Favorite changes only invalidate the cache of the worker that handled them;
+    # other workers may serve a stale isFavorite for up to this long
+    favorite_ids_cache_ttl_seconds: float = env_setting('FAVORITE_IDS_CACHE_TTL_SECONDS', 5, float)
+
+    # Elasticsearch
+    es_host: str = env_setting('ES_HOST')
+    es_user: str = env_setting('ES_USERNAME')
+    es_password: str = env_setting('ES_PASSWORD', secret=True)
+    es_max_connections: int = env_setting('ES_MAX_CONNECTIONS', 50, int)
+    es_request_timeout_seconds: float = env_setting('ES_REQUEST_TIMEOUT_SECONDS', 10.0, float)
+    es_max_retries: int = env_setting('ES_MAX_RETRIES', 3, int)
+    es_bulk_chunk_size: int = env_setting('ES_BULK_CHUNK_SIZE', 500, int)
+    es_bulk_concurrency: int = env_setting('ES_BULK_CONCURRENCY', 4, int)
+    es_retry_on_timeout: bool = env_setting('ES_RETRY_ON_TIMEOUT', True, _flag)
+
+    # Auth
+    secret_key: str = env_setting('SECRET_KEY', secret=True)
+    algorithm: str = env_setting('ALGORITHM')
+    access_token_expire_minutes: int = env_setting('ACCESS_TOKEN_EXPIRE_MINUTES', 30, int)
+    # Reject requests to the maps API that carry no bearer token
+    auth_required: bool = env_setting('AUTH_REQUIRED', False, _flag)
+    # Also look users up by email search, for accounts stored before users were keyed by email.
+    # Signup is a single create only once migrate_user_ids.py has run and this is false.
+    users_legacy_lookup: bool = env_setting('USERS_LEGACY_LOOKUP', True, _flag)
+    # bcrypt cost factor and the worker pool that runs it
+    bcrypt_rounds: int = env_setting('BCRYPT_ROUNDS', 12, int)
+    bcrypt_workers: int = env_setting('BCRYPT_WORKERS', os.cpu_count() or 1, int)
+    bcrypt_max_pending: int = env_setting('BCRYPT_MAX_PENDING', 64, int)
+
+    # Email configuration
+    mail_host: str = env_setting('MAIL_HOST', 'smtp.gmail.com')
+    mail_port: int = env_setting('MAIL_PORT', 587, int)
+    mail_username: str = env_setting('MAIL_USERNAME')
+    mail_password: str = env_setting('MAIL_PASSWORD', secret=True)
+    mail_use_tls: bool = env_setting('MAIL_USE_TLS', True, _flag)
+    mail_use_auth: bool = env_setting('MAIL_USE_AUTH', True, _flag)
 
+    # Background notification delivery
+    notification_spool_dir: str = env_setting('NOTIFICATION_SPOOL_DIR', 'notification_spool')
+    notification_workers: int = env_setting('NOTIFICATION_WORKERS', 2, int)
+    notification_batch_size: int = env_setting('NOTIFICATION_BATCH_SIZE', 20, int)
+    notification_max_attempts: int = env_setting('NOTIFICATION_MAX_ATTEMPTS', 5, int)
+    notification_retry_base_seconds: float = env_setting('NOTIFICATION_RETRY_BASE_SECONDS', 5.0, float)
+    notification_idle_close_seconds: float = env_setting('NOTIFICATION_IDLE_CLOSE_SECONDS', 60.0, float)
+
+    @classmethod
+    def from_env(cls):
+        values = {}
+        missing = []
+        for setting in fields(cls):
+            env_name, default, cast = setting.metadata["env"], setting.metadata["default"], setting.metadata["cast"]
+            value = os.environ.get(env_name)
+            if value is None or (value == "" and default is not _REQUIRED):
+                if default is _REQUIRED:
+                    missing.append(env_name)
+                values[setting.name] = default
+            else:
+                try:
+                    values[setting.name] = cast(value)
+                except ValueError:
+                    raise Exception(f"Invalid value for the {env_name} environment variable")
+        if missing:
+            raise Exception(f"Set the {', '.join(missing)} environment variable(s)")
+        return cls(**values)
+
+    @property
+    def google_places_api_base_url(self):
+        return f"{self.google_maps_api_root.rstrip('/')}/maps/api/place/nearbysearch/json"
+
+    @property
+    def google_geocode_api_base_url(self):
+        return f"{self.google_maps_api_root.rstrip('/')}/maps/api/geocode/json"
+
+    @property
+    def google_place_details_api_base_url(self):
+        return f"{self.google_maps_api_root.rstrip('/')}/maps/api/place/details/json"
+
+    @property
+    def google_place_photo_api_base_url(self):
+        return f"{self.google_maps_api_root.rstrip('/')}/maps/api/place/photo"
+
+    @property
+    def cache_namespaces(self) -> Dict[str, Dict[str, float]]:
+        return {
+            'restaurant_details': {
+                'maxsize': self.cache_restaurant_details_size,
+                'ttl': self.cache_restaurant_details_ttl_seconds,
+            },
+            'geocode': {'maxsize': self.cache_geocode_size, 'ttl': self.cache_geocode_ttl_seconds},
+            'reverse_geocode': {'maxsize': self.cache_reverse_geocode_size, 'ttl': self.cache_reverse_geocode_ttl_seconds},
+        }
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Load the settings once per process, failing fast on missing or invalid values.
+    """
+    load_dotenv()
+    settings = Settings.from_env()
+    log.info("loaded variables successfully ")
+    return settings
+
+
+def __getattr__(name):
+    # server_properties.ES_HOST style access, resolved against the loaded settings
+    if not name.isupper():
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        return getattr(get_settings(), name.lower())
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -0,0 +1,117 @@
+import datetime
+import hashlib
+import re
+from datetime import timedelta
+import server_properties
+import logger
+from helper import constants
+from helper.cache import CacheStats, read_through_cache
+from helper.es_client import get_es
+from helper.google_client import get_google_client
+
+log = logger.get_logger()
+
+geocode_stats = CacheStats("geocode")
+
+
+def normalize_address(location):
+    """
+    Normalize a free-form address so trivially different spellings share a cache entry.
+    """
+    location = " ".join(location.lower().split())
+    return re.sub(r"\s*,\s*", ", ", location).strip(" ,")
+
+def quantize_coordinates(latitude, longitude):
+    """
+    Round coordinates to GEOCODE_REVERSE_PRECISION decimal places, so nearby
+    reverse lookups share a cache entry.
+    """
+    precision = server_properties.GEOCODE_REVERSE_PRECISION
+    return round(float(latitude), precision), round(float(longitude), precision)
+
+def _geocode_doc_id(kind, key):
+    return f"{kind}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+
+async def get_lat_long(location):
+    coordinates = await _forward_cache.get(normalize_address(location))
+    return coordinates if coordinates else (None, None)
+
+async def _load_lat_long(address):
+    doc_id = _geocode_doc_id("forward", address)
+    cached = await _get_cached_geocode(doc_id)
+    if cached:
+        return cached['latitude'], cached['longitude']
+
+    response = await get_google_client().geocode(address)
+    log.info("Response Status Code: %s", response.status_code)
+    data = response.json()
+
+    if response.status_code == 200 and 'results' in data and data['results']:
+        latitude = data['results'][0]['geometry']['location']['lat']
+        longitude = data['results'][0]['geometry']['location']['lng']
+        await _store_geocode(doc_id, {
+            "kind": "forward",
+            "key": address,
+            "latitude": latitude,
+            "longitude": longitude,
+            "formatted_address": data['results'][0].get('formatted_address')
+        })
+        return latitude, longitude
+    else:
+        return None
+
+_forward_cache = read_through_cache("geocode", _load_lat_long)
+
+
+async def reverse_geocode(latitude, longitude):
+    address = await _reverse_cache.get(quantize_coordinates(latitude, longitude))
+    if not address:
+        raise Exception("Coordinates not found.")
+    return address
+
+async def _load_reverse_geocode(coordinates):
+    latitude, longitude = coordinates
+    doc_id = _geocode_doc_id("reverse", f"{latitude},{longitude}")
+    cached = await _get_cached_geocode(doc_id)
+    if cached:
+        return cached['formatted_address']
+
+    response = await get_google_client().reverse_geocode(latitude, longitude)
+    if response.status_code == 200:
+        result = response.json().get('results', [])
+        if result:
+            formatted_address = result[0].get('formatted_address')
+            await _store_geocode(doc_id, {
+                "kind": "reverse",
+                "key": f"{latitude},{longitude}",
+                "latitude": latitude,
+                "longitude": longitude,
+                "formatted_address": formatted_address
+            })
+            return formatted_address
+        else:
+            return None
+    else:
+        raise Exception(f"Error in reverse geocoding: {response.content}")
+
+_reverse_cache = read_through_cache("reverse_geocode", _load_reverse_geocode)
+
+
+async def _get_cached_geocode(doc_id):
+    index_name = constants.GEOCODE_CACHE
+    response = await get_es().options(ignore_status=404).get(index=index_name, id=doc_id)
+    if response.get('found'):
+        cached_at = datetime.datetime.fromisoformat(response['_source']['cached_at'])
+        max_age = timedelta(days=server_properties.GEOCODE_CACHE_TTL_DAYS)
+        if cached_at >= datetime.datetime.utcnow() - max_age:
+            geocode_stats.record_hit()
+            return response['_source']
+    geocode_stats.record_miss()
+    return None
+
+async def _store_geocode(doc_id, document):
+    index_name = constants.GEOCODE_CACHE
+    document = {**document, "cached_at": datetime.datetime.utcnow().isoformat()}
+    await get_es().index(index=index_name, id=doc_id, document=document)
+    log.info(f"Stored {document['kind']} geocode for '{document['key']}' in Elasticsearch.")
@@ -1,275 +1,659 @@
+import asyncio
 import datetime
 from fastapi import HTTPException
-import requests
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import server_properties
 import logger
-from helper import utility
+from helper.google_client import get_google_client
+from helper.es_client import get_es, bulk_in_chunks
+from helper.pagination import search_page, clamp_page_size
+from helper.index_mappings import ensure_indices
+from helper.auth import get_current_user
 from bs4 import BeautifulSoup
 from helper import constants
+from helper import geohash
+from helper.cache import TTLCache, CacheStats, SingleFlight, read_through_cache
+from service import geocode_service
+from service import rating_service
 import pytz
 
 from datetime import timedelta
 
 log = logger.get_logger()
 
-api_key = server_properties.GOOGLE_API_KEY
-# Elasticsearch connection configuration
-es = Elasticsearch(
-    hosts=[server_properties.ES_HOST],
-    http_auth=(server_properties.ES_USER, server_properties.ES_PASSWORD)
-)
-
-def get_lat_long(location):
-    url = server_properties.GOOGLE_GEOCODE_API_BASE_URL
-    params = {'address': location, 'key': api_key}
-    response = requests.get(url, params=params, verify=False)
-    log.info("Response Status Code: %s", response.status_code)
-    data = response.json()
-
-    if response.status_code == 200 and 'results' in data and data['results']:
-        latitude = data['results'][0]['geometry']['location']['lat']
-        longitude = data['results'][0]['geometry']['location']['lng']
-        return latitude, longitude
-    else:
-        return None, None
+# Per-user favorite restaurant IDs, invalidated whenever the user's favorites change
+_favorite_ids_cache = None
+restaurant_details_stats = CacheStats("restaurant_details")
+
+# Concurrent identical nearby searches share one upstream fetch
+_nearby_search_flights = SingleFlight()
+# Google fetches in progress, by keyword and covering cells
+_nearby_fills = {}
+
+
+class PlacesFetchError(Exception):
+    """Raised when a Google Places nearby search page cannot be fetched."""
+
+
+class _NearbyFill:
+    """
+    One Google fetch for a search area, shared by every request for it.
+    Pages are kept as they arrive, so streams that join late still get every
+    page. done is set once the full set is stored in Elasticsearch.
+    """
+
+    def __init__(self):
+        self.pages = []
+        self.error = None
+        self.done = False
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def add_page(self, page):
+        self.pages.append(page)
+        self._notify()
+
+    def finish(self, error=None):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def iter_pages(self):
+        index = 0
+        while True:
+            if index < len(self.pages):
+                index += 1
+                yield self.pages[index - 1]
+            elif self.done:
+                if self.error:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+    async def wait(self):
+        while not self.done:
+            await self._changed.wait()
+        if self.error:
+            raise self.error
+
+def _get_favorite_ids_cache():
+    global _favorite_ids_cache
+    if _favorite_ids_cache is None:
+        _favorite_ids_cache = TTLCache(
+            maxsize=server_properties.FAVORITE_IDS_CACHE_SIZE,
+            ttl=server_properties.FAVORITE_IDS_CACHE_TTL_SECONDS
+        )
+    return _favorite_ids_cache
 
 def get_photo_url(photo_reference, api_key, max_width=400):
     """
     Given a photo reference, return the URL of the photo.
     max_width is the size of the photo to request.
     """
-    base_url = "https://maps.googleapis.com/maps/api/place/photo"
+    base_url = server_properties.GOOGLE_PLACE_PHOTO_API_BASE_URL
     photo_url = f"{base_url}?maxwidth={max_width}&photoreference={photo_reference}&key={api_key}"
     return photo_url
 
-def find_nearby_restaurants(api_key, location, user_id, radius=5000, keyword='restaurant'):
+def _nearby_search_key(location, radius, keyword):
+    return (geocode_service.normalize_address(location), float(radius), keyword.strip().lower())
+
+async def find_nearby_restaurants(location, radius, user_id, keyword='restaurant', sort='rating', page_size=None, cursor=None):
+    """
+    Return (restaurants, next_cursor) for a nearby search.
+    Results are always read from Elasticsearch, sorted there by rating or
+    distance. Without page_size a single bounded page is returned and
+    next_cursor is None; with page_size the pages are walked with the cursor.
+    """
     log.info("Inside find_nearby_restaurants")
-    user_id1 = radius
+    paginate = bool(page_size or cursor)
+    page_size = clamp_page_size(page_size, server_properties.NEARBY_CACHE_MAX_RESULTS)
 
+    if cursor:
+        # Later pages read from the point-in-time opened by the first page
+        latitude, longitude, radius_in_meters, _, _ = await _resolve_search_area(location, radius)
+    else:
+        # Requests for the same normalized search share one geocode, cache check and Google fetch
+        latitude, longitude, radius_in_meters = await _nearby_search_flights.do(
+            _nearby_search_key(location, radius, keyword), lambda: _ensure_nearby_area_cached(location, radius, keyword)
+        )
+
+    restaurants, next_cursor = await get_cached_nearby_restaurants(
+        latitude, longitude, radius_in_meters, keyword, sort=sort, page_size=page_size, cursor=cursor, paginate=paginate
+    )
+
+    # Add isFavorite flag for this user and the in-app rating summary
+    favorite_ids, summaries = await asyncio.gather(
+        fetch_user_favorite_ids(user_id),
+        rating_service.get_rating_summaries([restaurant['id'] for restaurant in restaurants])
+    )
+    for restaurant in restaurants:
+        restaurant['isFavorite'] = restaurant['id'] in favorite_ids
+        summary = summaries.get(restaurant['id'])
+        restaurant['app_rating'] = {"count": summary['count'], "average": summary['average']} if summary else None
+    return restaurants, next_cursor
+
+async def stream_nearby_restaurants(location, radius, user_id, keyword='restaurant'):
+    """
+    Yield nearby restaurants page by page, so the first page can be sent to the
+    client while later Google pages are still being fetched. The Google fetch
+    is shared with every other search over the same cells.
+    A failed geocode raises a 400 and a failed Google fetch a 502, both from
+    the first iteration, before anything is sent.
+    """
+    log.info("Inside stream_nearby_restaurants")
+    latitude, longitude, radius_in_meters, precision, cells = await _resolve_search_area(location, radius)
+    favorite_ids = await fetch_user_favorite_ids(user_id)
+
+    if await are_search_cells_fresh(cells, keyword, radius_in_meters):
+        log.info(f"Found fresh cached cells ({len(cells)} at precision {precision}).")
+        restaurants, _ = await get_cached_nearby_restaurants(latitude, longitude, radius_in_meters, keyword)
+        yield [{**restaurant, 'isFavorite': restaurant['id'] in favorite_ids} for restaurant in restaurants]
+        return
+
+    fill = _join_nearby_fill(latitude, longitude, radius_in_meters, keyword, precision, cells)
+    try:
+        async for page in fill.iter_pages():
+            yield [{**restaurant, 'isFavorite': restaurant['id'] in favorite_ids} for restaurant in page]
+    except PlacesFetchError as e:
+        raise HTTPException(status_code=502, detail="Error fetching restaurants from Google") from e
+
+async def _resolve_search_area(location, radius):
     # First, try to get latitude and longitude for the given location
-    latitude, longitude = get_lat_long(location)
+    latitude, longitude = await geocode_service.get_lat_long(location)
     if latitude is None or longitude is None:
         raise HTTPException(status_code=400, detail="Error while fetching latitude or longitude")
-    radius = user_id
-    user_id = user_id1
-    
-    print("latitude",latitude,"longitude",longitude,"radius",radius,"user_id",user_id)
-    print("radius in miles ",radius)
+
     radius_in_meters = radius * 1609.34
-    print("radius_in_meters",radius_in_meters)
+    log.info(f"Searching {radius} miles ({radius_in_meters} m) around {latitude},{longitude}")
 
+    # Geohash cells covering the search circle, used as the cache unit
+    precision, cells = geohash.covering_cells(
+        latitude, longitude, radius_in_meters, max_cells=server_properties.NEARBY_CACHE_MAX_CELLS
+    )
+    return latitude, longitude, radius_in_meters, precision, cells
 
-    # Check if nearby restaurants are cached in Elasticsearch
-    cached_restaurants = get_cached_nearby_restaurants(latitude, longitude, radius_in_meters)
-    if cached_restaurants:
-        log.info("Found cached restaurants.")
-        
-        # Fetch user favorites
-        print("user_id",user_id1)
-        user_favorites = fetch_user_favorites(user_id1)
-        print("user_favourite ",user_favorites)
-        favorite_ids = {fav['id'] for fav in user_favorites} if user_favorites else set()
-        
-        # Add isFavorite flag to cached restaurants
-        for restaurant in cached_restaurants:
-            restaurant['isFavorite'] = restaurant['id'] in favorite_ids
-        
-        return cached_restaurants
+async def _ensure_nearby_area_cached(location, radius, keyword):
+    """
+    Make sure Elasticsearch holds the restaurants for the search circle,
+    fetching every Places page from Google when any covering cell is stale.
+    Returns (latitude, longitude, radius_in_meters) for the search query.
+    """
+    latitude, longitude, radius_in_meters, precision, cells = await _resolve_search_area(location, radius)
 
-    # If no cached restaurants, fetch from Google API
-    location_str = f"{latitude},{longitude}"
-    log.info(f"Fetching nearby restaurants from Google API near {location_str}...")
-    url = utility.build_places_url(location_str, radius_in_meters, keyword)
-    #log.info(f"build url -> {url}")
-    response = requests.get(url, verify=False)
+    # Nothing to do when every geohash cell covering the circle was fetched recently
+    if await are_search_cells_fresh(cells, keyword, radius_in_meters):
+        log.info(f"Found fresh cached cells ({len(cells)} at precision {precision}).")
+        return latitude, longitude, radius_in_meters
 
-    log.info("Response Status Code: %s", response.status_code)
-    response_data = response.json()
+    try:
+        await _join_nearby_fill(latitude, longitude, radius_in_meters, keyword, precision, cells).wait()
+    except PlacesFetchError:
+        # The pages fetched before the failure are stored; the cells stay stale
+        pass
+    return latitude, longitude, radius_in_meters
 
-    if response.status_code == 200 and 'results' in response_data:
-        results = response_data['results']
-        if results:
-            restaurants = []
-            
-            # Fetch user favorites
-            user_favorites = fetch_user_favorites(user_id)
-            favorite_ids = {fav['id'] for fav in user_favorites} if user_favorites else set()
-
-            for place in results:
-                restaurant_info = {
-                    'id': place.get('place_id'),
-                    'name': place.get('name'),
-                    'address': place.get('vicinity'),
-                    'rating': place.get('rating'),
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'radius': radius,
-                    'isFavorite': place.get('place_id') in favorite_ids  # Check if this restaurant is a favorite
-                }
+def _join_nearby_fill(latitude, longitude, radius_in_meters, keyword, precision, cells):
+    """
+    Return the running Google fetch for these cells, starting one if needed.
+    The fetch runs as its own task, so it completes and is stored even when
+    the request that started it goes away.
+    """
+    fill_key = (keyword.strip().lower(), precision, tuple(cells))
+    fill = _nearby_fills.get(fill_key)
+    if fill is None:
+        fill = _NearbyFill()
+        _nearby_fills[fill_key] = fill
+        fill.task = asyncio.create_task(
+            _run_nearby_fill(fill, latitude, longitude, radius_in_meters, keyword, precision, cells)
+        )
+        fill.task.add_done_callback(lambda _: _nearby_fills.pop(fill_key, None))
+    return fill
+
+async def _run_nearby_fill(fill, latitude, longitude, radius_in_meters, keyword, precision, cells):
+    restaurants = []
+    error = None
+    complete = True
+    try:
+        try:
+            async for page, has_more in _iter_google_nearby_pages(latitude, longitude, radius_in_meters, keyword):
+                restaurants.extend(page)
+                complete = not has_more
+                fill.add_page(page)
+        except PlacesFetchError as e:
+            error = e
+
+        # Store the full set in one bulk; only a successful fetch marks the searched cells as fetched
+        await store_nearby_restaurants(restaurants, keyword, cells, refresh="wait_for")
+        if error is None:
+            await mark_search_cells_fetched(cells, precision, keyword, radius_in_meters, complete)
+    except Exception as e:
+        log.error(f"Storing nearby restaurants failed: {e}")
+        error = error or e
+    finally:
+        fill.finish(error)
+
+async def cancel_nearby_fills():
+    """
+    Cancel running Google fetches, e.g. before the clients they use are closed.
+    Cells of a cancelled fetch stay stale and are fetched again by the next search.
+    """
+    tasks = [fill.task for fill in _nearby_fills.values()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
-                # Check if photos are available
-                if 'photos' in place:
-                    photo_reference = place['photos'][0].get('photo_reference')
-                    if photo_reference:
-                        photo_url = get_photo_url(photo_reference, api_key)
-                        restaurant_info['photo_url'] = photo_url
+async def _iter_google_nearby_pages(latitude, longitude, radius_in_meters, keyword):
+    location_str = f"{latitude},{longitude}"
+    log.info(f"Fetching nearby restaurants from Google API near {location_str}...")
+    pages = get_google_client().iter_nearby_pages(
+        location_str,
+        radius_in_meters,
+        keyword,
+        max_pages=server_properties.NEARBY_MAX_PAGES,
+        token_delay=server_properties.GOOGLE_PAGE_TOKEN_DELAY_SECONDS
+    )
+    seen_ids = set()
+    async for response in pages:
+        log.info("Response Status Code: %s", response.status_code)
+        response_data = response.json()
+
+        if response.status_code != 200 or 'results' not in response_data:
+            log.error(f"Error fetching restaurants: {response_data.get('error_message', 'Unknown error')}")
+            raise PlacesFetchError(response_data.get('error_message', 'Unknown error'))
+
+        page = []
+        for place in response_data['results']:
+            if place.get('place_id') in seen_ids:
+                continue
+            seen_ids.add(place.get('place_id'))
+            page.append(_restaurant_from_place(place))
+        # A page token left after the last page means Google capped the results
+        yield page, bool(response_data.get('next_page_token'))
+
+def _restaurant_from_place(place):
+    place_location = place.get('geometry', {}).get('location', {})
+    restaurant_info = {
+        'id': place.get('place_id'),
+        'name': place.get('name'),
+        'address': place.get('vicinity'),
+        'rating': place.get('rating'),
+        'latitude': place_location.get('lat'),
+        'longitude': place_location.get('lng'),
+    }
 
-                restaurants.append(restaurant_info)
+    # Check if photos are available
+    if 'photos' in place:
+        photo_reference = place['photos'][0].get('photo_reference')
+        if photo_reference:
+            photo_url = get_photo_url(photo_reference, server_properties.GOOGLE_API_KEY)
+            restaurant_info['photo_url'] = photo_url
 
-            # Store the fetched restaurants in Elasticsearch for future use
-            store_nearby_restaurants(restaurants, latitude, longitude, radius)
+    return restaurant_info
 
-            # Return sorted restaurants by rating (high to low)
-            sorted_data = sorted(restaurants, key=lambda x: x['rating'], reverse=True)
-            return sorted_data
-        else:
-            log.info("Found 0 restaurants.")
-            return []
-    else:
-        log.error(f"Error fetching restaurants: {response_data.get('error_message', 'Unknown error')}")
-        return []
 
+def _search_cell_id(cell, keyword):
+    return f"{keyword.strip().lower()}:{cell}"
+
+# Helper method to check whether every cell covering a search was fetched recently
+async def are_search_cells_fresh(cells, keyword, radius_in_meters):
+    """
+    A cell is fresh when it was fetched within NEARBY_CACHE_TTL_HOURS by a
+    search Google answered in full. A cell fetched by a search Google capped
+    (results left after NEARBY_MAX_PAGES) only holds the top places of that
+    radius, so it is reused only for searches at least that wide.
+    """
+    index_name = constants.NEARBY_SEARCH_TILES
+    ids = [_search_cell_id(cell, keyword) for cell in cells]
+    response = await get_es().mget(index=index_name, ids=ids)
+
+    cutoff = datetime.datetime.utcnow() - timedelta(hours=server_properties.NEARBY_CACHE_TTL_HOURS)
+    for doc in response['docs']:
+        if not doc.get('found'):
+            return False
+        source = doc['_source']
+        fetched_at = datetime.datetime.fromisoformat(source['fetched_at'])
+        if fetched_at < cutoff:
+            return False
+        if not source.get('complete') and radius_in_meters < source.get('radius_meters', float('inf')):
+            return False
+    return True
+
+async def mark_search_cells_fetched(cells, precision, keyword, radius_in_meters, complete):
+    """
+    Record the cells as fetched. complete is False when Google had more
+    results than NEARBY_MAX_PAGES pages returned.
+    """
+    index_name = constants.NEARBY_SEARCH_TILES
+    fetched_at = datetime.datetime.utcnow().isoformat()
+    actions = [
+        {
+            "_op_type": "index",
+            "_index": index_name,
+            "_id": _search_cell_id(cell, keyword),
+            "_source": {
+                "geohash": cell,
+                "precision": precision,
+                "search_keyword": keyword,
+                "radius_meters": radius_in_meters,
+                "complete": complete,
+                "fetched_at": fetched_at
+            }
+        }
+        for cell in cells
+    ]
+    success, failed = await bulk_in_chunks(actions)
+    log.info(f"Marked {success} search cells as fetched, {len(failed)} failed.")
 
 # Helper method to fetch cached restaurants from Elasticsearch
-def get_cached_nearby_restaurants(latitude, longitude, radius):
-    #index_name = "restaurants"
+async def get_cached_nearby_restaurants(latitude, longitude, radius, keyword='restaurant', sort='rating', page_size=None, cursor=None, paginate=False):
+    """
+    Return (restaurants, next_cursor) for the cached restaurants inside the circle,
+    sorted by rating (high to low) or distance (near to far).
+    """
     index_name = constants.RESTAURANTS_INDEX
+    await ensure_indices()
 
     query = {
-        "query": {
-            "bool": {
-                "must": [
-                    {"match": {"latitude": latitude}},
-                    {"match": {"longitude": longitude}},
-                    {"match": {"radius": radius}}
-                ]
-            }
+        "bool": {
+            "filter": [
+                {"term": {"search_keywords": keyword.strip().lower()}},
+                {
+                    "geo_distance": {
+                        "distance": f"{radius}m",
+                        "location": {"lat": latitude, "lon": longitude}
+                    }
+                }
+            ]
         }
     }
-    print("query -> ",query)
-    response = es.search(index=index_name, body=query)
-    if response['hits']['total']['value'] > 0:
-        restaurants = [hit['_source'] for hit in response['hits']['hits']]
-        log.info("Returning cached restaurants.")
-        return restaurants
+    if sort == 'distance':
+        sort_spec = [{"_geo_distance": {"location": {"lat": latitude, "lon": longitude}, "order": "asc", "unit": "m"}}]
     else:
-        return []
-def store_nearby_restaurants(restaurant_data, latitude, longitude, radius):
-    #index_name = "restaurants"
+        sort_spec = [{"rating": {"order": "desc", "missing": "_last", "unmapped_type": "float"}}]
+
+    hits, next_cursor = await search_page(
+        index_name,
+        query,
+        sort_spec,
+        page_size or server_properties.NEARBY_CACHE_MAX_RESULTS,
+        cursor=cursor,
+        paginate=paginate
+    )
+    restaurants = []
+    for hit in hits:
+        source = hit['_source']
+        restaurant_info = {
+            'id': source.get('id'),
+            'name': source.get('name'),
+            'address': source.get('address'),
+            'rating': source.get('rating'),
+            'latitude': source.get('latitude'),
+            'longitude': source.get('longitude'),
+        }
+        if source.get('photo_url'):
+            restaurant_info['photo_url'] = source['photo_url']
+        restaurants.append(restaurant_info)
+    log.info(f"Returning {len(restaurants)} cached restaurants.")
+    return restaurants, next_cursor
+
+# Merges a fetched place into its document, keeping every keyword and search tile that returned it
+_UPSERT_RESTAURANT_SCRIPT = """
+ctx._source.putAll(params.restaurant);
+if (ctx._source.search_keywords == null) { ctx._source.search_keywords = []; }
+if (!ctx._source.search_keywords.contains(params.keyword)) { ctx._source.search_keywords.add(params.keyword); }
+if (ctx._source.search_tiles == null) { ctx._source.search_tiles = []; }
+for (tile in params.tiles) {
+    if (!ctx._source.search_tiles.contains(tile)) { ctx._source.search_tiles.add(tile); }
+}
+"""
+
+async def store_nearby_restaurants(restaurant_data, keyword='restaurant', cells=(), refresh=None):
+    """
+    Upsert fetched restaurants into the restaurants index, one document per place_id.
+    Re-fetching a place updates its document instead of adding a copy, and the
+    keyword and search tiles that produced it are accumulated on the document.
+    The caller's dicts are left untouched.
+    """
     index_name = constants.RESTAURANTS_INDEX
+    await ensure_indices()
+    keyword = keyword.strip().lower()
+    tiles = [_search_cell_id(cell, keyword) for cell in cells]
+    fetched_at = datetime.datetime.utcnow().isoformat()
     actions = []
-    
-    # Prepare actions for the bulk API
+
+    # Prepare actions for the bulk API, one upsert per place
     for restaurant in restaurant_data:
-        # Add the additional fields for latitude, longitude, and radius
-        restaurant['latitude'] = latitude
-        restaurant['longitude'] = longitude
-        restaurant['radius'] = radius
+        if not restaurant.get('id'):
+            continue
+        document = dict(restaurant)
+        document['fetched_at'] = fetched_at
+        if restaurant.get('latitude') is not None and restaurant.get('longitude') is not None:
+            document['location'] = {"lat": restaurant['latitude'], "lon": restaurant['longitude']}
 
-        # Prepare the document action for the bulk API
         action = {
-            "_op_type": "index",  # Operation type: "index" means create or replace
+            "_op_type": "update",
             "_index": index_name,
-            "_source": restaurant
+            "_id": restaurant['id'],
+            "script": {
+                "source": _UPSERT_RESTAURANT_SCRIPT,
+                "lang": "painless",
+                "params": {"restaurant": document, "keyword": keyword, "tiles": tiles}
+            },
+            "scripted_upsert": True,
+            "upsert": {}
         }
         actions.append(action)
-    
-    # Perform the bulk insert into Elasticsearch
+
+    # Perform the bulk upsert into Elasticsearch
     if actions:
-        success, failed = bulk(es, actions)
-        log.info(f"Bulk insert completed. {success} documents indexed, {failed} failed.")
+        success, failed = await bulk_in_chunks(actions, refresh=refresh)
+        log.info(f"Bulk upsert completed. {success} documents upserted, {len(failed)} failed.")
     else:
         log.info("No restaurants to index.")
 
-def get_restaurant_details(api_key, restaurant_id, user_id=None):
+async def get_restaurant_details(restaurant_id, user_id=None):
+    # Served from the in-process cache, then Elasticsearch, then Google Places API
+    details = await _restaurant_details_cache.get(restaurant_id)
+    if not details:
+        return {}
+
+    # Copy before annotating, the cached dict is shared between requests
+    details = dict(details)
+
+    # Add isFavorite flag if user_id is provided
+    if user_id:
+        details['isFavorite'] = restaurant_id in await fetch_user_favorite_ids(user_id)
+
+    return details
+
+async def _load_restaurant_details(restaurant_id):
     # First, check if restaurant details are already cached in Elasticsearch
-    cached_details = get_cached_restaurant_details(restaurant_id)
+    cached_details = await get_cached_restaurant_details(restaurant_id)
     if cached_details:
         log.info(f"Found cached details for restaurant ID: {restaurant_id}")
-        # Add isFavorite flag if user_id is provided
-        if user_id:
-            user_favorites = fetch_user_favorites(user_id)
-            favorite_ids = {fav['id'] for fav in user_favorites} if user_favorites else set()
-            cached_details['isFavorite'] = restaurant_id in favorite_ids
         return cached_details
 
     # If not cached, fetch the details from Google Places API
+    return await fetch_restaurant_details_from_google(restaurant_id)
+
+_restaurant_details_cache = read_through_cache("restaurant_details", _load_restaurant_details)
+
+async def get_restaurant_details_for_ids(restaurant_ids, user_id=None):
+    """
+    Return {restaurant_id: details} for a list view, with isFavorite set when
+    user_id is provided. IDs that could not be resolved are left out.
+    """
+    details_by_id, favorite_ids = await asyncio.gather(
+        get_restaurant_details_batch(restaurant_ids),
+        fetch_user_favorite_ids(user_id)
+    )
+    results = {}
+    for restaurant_id, details in details_by_id.items():
+        # Copy before annotating, the cached dict is shared between requests
+        details = dict(details)
+        if user_id:
+            details['isFavorite'] = restaurant_id in favorite_ids
+        results[restaurant_id] = details
+    return results
+
+async def fetch_restaurant_details_from_google(restaurant_id):
     log.info(f"Fetching details for restaurant ID: {restaurant_id} from Google API...")
-    url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={restaurant_id}&key={api_key}"
-    response = requests.get(url, verify=False)
+    response = await get_google_client().place_details(restaurant_id)
 
     if response.status_code == 200:
         details = response.json().get('result', {})
 
         # Store the fetched details in Elasticsearch for future use
-        store_restaurant_details(details)
-
-        # Add isFavorite flag if user_id is provided
-        if user_id:
-            user_favorites = fetch_user_favorites(user_id)
-            favorite_ids = {fav['id'] for fav in user_favorites} if user_favorites else set()
-            details['isFavorite'] = restaurant_id in favorite_ids
-
-        return details
+        return await store_restaurant_details(details)
     else:
         log.error(f"Error fetching details for restaurant ID {restaurant_id}: {response.content}")
         return {}
-    
 
-def store_restaurant_details(restaurant_details):
-    # Index the restaurant details in Elasticsearch
+async def get_restaurant_details_batch(restaurant_ids):
+    """
+    Resolve details for many restaurants at once.
+    IDs missing from the in-process cache are read with a single mget against the
+    details index, and the remaining misses are fetched from Google concurrently,
+    bounded by GOOGLE_MAX_CONCURRENT_REQUESTS.
+    Returns a dict of restaurant ID to details; IDs that could not be resolved are left out.
+    The returned dicts are shared with the cache and must not be mutated.
+    """
+    restaurant_ids = list(dict.fromkeys(rid for rid in restaurant_ids if rid))
+    details_by_id = {}
+    for restaurant_id in restaurant_ids:
+        details = _restaurant_details_cache.get_cached(restaurant_id)
+        if details:
+            details_by_id[restaurant_id] = details
+
+    uncached_ids = [rid for rid in restaurant_ids if rid not in details_by_id]
+    if not uncached_ids:
+        return details_by_id
+
+    index_name = constants.RESTAURANT_DETAILS
+    # A missing details index reads as all misses, like the single-ID lookup
+    response = await get_es().options(ignore_status=404).mget(index=index_name, ids=uncached_ids)
+    for doc in response.get('docs', []):
+        details = _fresh_cached_details(doc)
+        if details:
+            details_by_id[doc['_id']] = details
+            _restaurant_details_cache.set(doc['_id'], details)
+
+    missing_ids = [rid for rid in uncached_ids if rid not in details_by_id]
+    restaurant_details_stats.record_hit(len(uncached_ids) - len(missing_ids))
+    restaurant_details_stats.record_miss(len(missing_ids))
+    log.info(f"Resolved {len(restaurant_ids) - len(missing_ids)} of {len(restaurant_ids)} restaurant details from cache.")
+    if missing_ids:
+        semaphore = asyncio.Semaphore(server_properties.GOOGLE_MAX_CONCURRENT_REQUESTS)
+
+        async def fetch(restaurant_id):
+            async with semaphore:
+                details = await _restaurant_details_cache.load(restaurant_id, loader=fetch_restaurant_details_from_google)
+                return restaurant_id, details
+
+        for restaurant_id, details in await asyncio.gather(*(fetch(rid) for rid in missing_ids)):
+            if details:
+                details_by_id[restaurant_id] = details
+
+    return details_by_id
+
+
+async def store_restaurant_details(restaurant_details):
+    """
+    Index the restaurant details in Elasticsearch and return them with the
+    adr_address components parsed into address_parts, so reads never parse HTML.
+    """
     # index_name = "restaurants_details"
     index_name = constants.RESTAURANT_DETAILS
     restaurant_id = restaurant_details.get('place_id')
-    if restaurant_id:
-        es.index(index=index_name, id=restaurant_id, document=restaurant_details)
-        log.info(f"Stored restaurant details for {restaurant_id} in Elasticsearch.")
+    if not restaurant_id:
+        # Google found nothing for this ID; stay falsy so the result isn't cached
+        return restaurant_details
+    restaurant_details = {**restaurant_details, "address_parts": parse_adr_address(restaurant_details.get('adr_address'))}
+    document = {**restaurant_details, "cached_at": datetime.datetime.utcnow().isoformat()}
+    await get_es().index(index=index_name, id=restaurant_id, document=document)
+    log.info(f"Stored restaurant details for {restaurant_id} in Elasticsearch.")
+    return restaurant_details
+
+def parse_adr_address(adr_address):
+    """
+    Split Google's adr_address microformat into its components, e.g.
+    {"street_address": ..., "locality": ..., "region": ..., "postal_code": ..., "country_name": ...}.
+    """
+    if not adr_address:
+        return {}
+    soup = BeautifulSoup(adr_address, 'html.parser')
+    address_parts = {}
+    for span in soup.find_all('span', class_=True):
+        for css_class in span['class']:
+            address_parts[css_class.replace('-', '_')] = span.get_text()
+    return address_parts
+
+def get_locality(restaurant_details):
+    return (restaurant_details.get('address_parts') or {}).get('locality')
 
 # Get restaurant details from Elasticsearch (cached)
-def get_cached_restaurant_details(restaurant_id):
+async def get_cached_restaurant_details(restaurant_id):
     # index_name = "restaurants_details"
     index_name = constants.RESTAURANT_DETAILS
-    query = {
-        "query": {
-            "match": {
-                "restaurant_id": restaurant_id
-            }
-        }
-    }
-    response = es.search(index=index_name, body=query)
-    if response['hits']['total']['value'] > 0:
-        return response['hits']['hits'][0]['_source']
+    # Details are indexed by place ID, so this is a primary-key lookup
+    response = await get_es().options(ignore_status=404).get(index=index_name, id=restaurant_id)
+    details = _fresh_cached_details(response)
+    if details:
+        restaurant_details_stats.record_hit()
     else:
+        restaurant_details_stats.record_miss()
+    return details
+
+def _fresh_cached_details(doc):
+    """
+    Return the cached details of a get/mget doc, or None when the doc is
+    missing or older than RESTAURANT_DETAILS_MAX_AGE_HOURS.
+    """
+    if not doc.get('found'):
+        return None
+    details = dict(doc['_source'])
+    cached_at = details.pop('cached_at', None)
+    if not cached_at:
+        return None
+    max_age = timedelta(hours=server_properties.RESTAURANT_DETAILS_MAX_AGE_HOURS)
+    if datetime.datetime.fromisoformat(cached_at) < datetime.datetime.utcnow() - max_age:
         return None
+    return details
 
-def store_user_review(user_id,restaurant_id,rating,review_text):
+async def store_user_review(user_id,restaurant_id,rating,review_text):
     log.info("Inside store user review...")
 
     index_name = constants.USER_REVIEWS
-    query = {
-        "query": {
-            "term": {
-                "user_id": user_id
+    user = get_current_user()
+    if user and user.user_id == user_id and user.username:
+        # The verified token already names the author, no user lookup needed
+        author_name = user.username
+    else:
+        query = {
+            "query": {
+                "term": {
+                    "user_id.keyword": user_id
+                }
             }
         }
-    }
 
-    res = es.search(index=constants.USER_INDEX, body=query)
-    log.info("Fetched user info from index...")
+        res = await get_es().search(index=constants.USER_INDEX, body=query)
+        log.info("Fetched user info from index...")
 
-    if res['hits']['total']['value'] == 0:
-        return {"success": False, "error": "User Doesn't Exist"}
+        if res['hits']['total']['value'] == 0:
+            return {"success": False, "error": "User Doesn't Exist"}
 
-    user_data = res['hits']['hits'][0]['_source']
+        author_name = res['hits']['hits'][0]['_source']['username']
 
     # Convert UTC time to New York timezone
     utc_now = datetime.datetime.utcnow()
-    print(utc_now)
     new_york_tz = pytz.timezone("America/New_York")
     ny_time = pytz.utc.localize(utc_now).astimezone(new_york_tz)
-    print(f"New York Time: {ny_time}")
+    log.debug("New York Time: %s", ny_time)
 
     # Create review data structure
     review_data = {
@@ -280,16 +664,22 @@ def store_user_review(user_id,restaurant_id,rating,review_text):
         "review_text": review_text,
         #"created_at": datetime.datetime.utcnow().isoformat(),
         "created_at": ny_time.isoformat(),  # Store in ISO format with New York timezone
-        "author_name": user_data['username']
+        "author_name": author_name
     }
-    print(review_data)
-    response = es.index(index=index_name, document=review_data)
+    log.debug("Review data: %s", review_data)
+    response = await get_es().index(index=index_name, document=review_data)
     log.info(f"Stored review for user {review_data['user_id']} at restaurant {review_data['restaurant_id']}.")
+
+    # Keep the restaurant's in-app rating summary current; the reconcile job repairs missed updates
+    try:
+        await rating_service.record_review_rating(restaurant_id, rating)
+    except Exception as e:
+        log.error(f"Failed to update rating summary for restaurant {restaurant_id}: {e}")
     return response
 
-def fetch_restaurant_reviews(api_key, restaurant_id):
+async def fetch_restaurant_reviews(restaurant_id):
     # Fetch restaurant details using the existing method
-    result = get_restaurant_details(api_key, restaurant_id)
+    result = await get_restaurant_details(restaurant_id)
     log.info("Response received from get_restaurant_details method", result)
 
     # Extract the relevant data
@@ -318,20 +708,49 @@ def fetch_restaurant_reviews(api_key, restaurant_id):
 
 
 # Store restaurant reviews in Elasticsearch
-def store_restaurant_review(review_data):
+async def store_restaurant_review(review_data):
     # index_name = "restaurant_reviews"
     index_name = constants.RESTAURANT_REVIEWS
-    response = es.index(index=index_name, document=review_data)
+    response = await get_es().index(index=index_name, document=review_data)
     return response
 
 # Store user favorites in Elasticsearch
-def store_user_favorite(favorite_data):
+async def store_user_favorite(favorite_data):
     # index_name = "user_favorites"
     index_name = constants.USER_FAVORITES
-    response = es.index(index=index_name, document=favorite_data)
+    # Wait for the refresh so the next favorite-ID lookup sees this write
+    response = await get_es().index(index=index_name, document=favorite_data, refresh="wait_for")
+    _get_favorite_ids_cache().invalidate(favorite_data['user_id'])
     return response
 
-def fetch_user_favorites(user_id):
+async def fetch_user_favorite_ids(user_id):
+    """
+    Return the set of restaurant IDs the user has marked as favorite.
+    Only restaurant_id is read from USER_FAVORITES, and the set is cached per user
+    until the TTL expires or the user's favorites change in this process. Other
+    workers see the change once FAVORITE_IDS_CACHE_TTL_SECONDS expires.
+    """
+    if not user_id:
+        return frozenset()
+
+    favorite_ids = _get_favorite_ids_cache().get(user_id)
+    if favorite_ids is not None:
+        return favorite_ids
+
+    index_name = constants.USER_FAVORITES
+    response = await get_es().search(
+        index=index_name,
+        query={"term": {"user_id.keyword": user_id}},
+        source=["restaurant_id"],
+        size=server_properties.FAVORITES_MAX_RESULTS
+    )
+    favorite_ids = frozenset(
+        hit['_source']['restaurant_id'] for hit in response['hits']['hits'] if hit['_source'].get('restaurant_id')
+    )
+    _get_favorite_ids_cache().set(user_id, favorite_ids)
+    return favorite_ids
+
+async def fetch_user_favorites(user_id):
     # index_name = "user_favorites"
     index_name = constants.USER_FAVORITES
     query = {
@@ -343,30 +762,29 @@ def fetch_user_favorites(user_id):
     }
     
     # Fetch user favorites from Elasticsearch
-    response = es.search(index=index_name, body=query)
-    print(response)
-    print(response['hits']['total']['value'])
+    response = await get_es().search(index=index_name, body=query, size=server_properties.FAVORITES_MAX_RESULTS)
+    log.info(f"Found {response['hits']['total']['value']} favorites for user {user_id}.")
     if(response['hits']['total']['value']==0):
         return response['hits']['total']['value']
-    
+
+    # Resolve all favorite restaurants in one batch
+    restaurant_ids = [hit['_source']['restaurant_id'] for hit in response['hits']['hits']]
+    details_by_id = await get_restaurant_details_batch(restaurant_ids)
+
     # List to store restaurant details
     restaurant_details_list = []
-    
-    # Loop through the favorites and fetch restaurant details
-    for hit in response['hits']['hits']:
-        restaurant_id = hit['_source']['restaurant_id']
-        
-        # Fetch restaurant details using the provided function
-        details = get_restaurant_details(api_key, restaurant_id)
-        
+
+    for restaurant_id in restaurant_ids:
+        details = details_by_id.get(restaurant_id)
+
         if details:
             restaurant_info = {
                 "id": restaurant_id,
                 "name": details.get("name"),
-                "location": extract_locality_from_adr_address(details.get("adr_address")),
+                "location": get_locality(details),
                 "map_url": details.get("url"),
                 "rating": details.get("rating"),
-                "image": get_photo_url(details.get("photos")[0]['photo_reference'], api_key) if details.get("photos") else None
+                "image": get_photo_url(details.get("photos")[0]['photo_reference'], server_properties.GOOGLE_API_KEY) if details.get("photos") else None
             }
             
             restaurant_details_list.append(restaurant_info)
@@ -374,74 +792,64 @@ def fetch_user_favorites(user_id):
     return restaurant_details_list
 
 
-def fetch_reviews_by_restaurant(restaurant_id):
-    #index_name = "user_reviews"
+def _review_sort(sort):
+    recency = {"created_at": {"order": "desc", "missing": "_last", "unmapped_type": "date"}}
+    if sort == 'rating':
+        return [{"rating": {"order": "desc", "missing": "_last", "unmapped_type": "float"}}, recency]
+    return [recency]
+
+async def _fetch_reviews(field, value, sort, page_size, cursor):
     index_name = constants.USER_REVIEWS
-    query = {
-        "query": {
-            "match": {
-                "restaurant_id": restaurant_id
-            }
-        }
-    }
-    response = es.search(index=index_name, body=query)
-    if response['hits']['total']['value'] > 0:
-        reviews = [hit['_source'] for hit in response['hits']['hits']]
+    query = {"term": {f"{field}.keyword": value}}
+    hits, next_cursor = await search_page(
+        index_name,
+        query,
+        _review_sort(sort),
+        clamp_page_size(page_size, server_properties.REVIEWS_MAX_RESULTS),
+        cursor=cursor,
+        paginate=bool(page_size or cursor)
+    )
+    return [hit['_source'] for hit in hits], next_cursor
+
+async def fetch_reviews_by_restaurant(restaurant_id, sort='recency', page_size=None, cursor=None):
+    """
+    Return (reviews, next_cursor) for a restaurant, sorted in Elasticsearch by recency or rating.
+    """
+    reviews, next_cursor = await _fetch_reviews("restaurant_id", restaurant_id, sort, page_size, cursor)
+    if reviews:
         log.info(f"Found {len(reviews)} reviews for restaurant {restaurant_id}.")
-        return reviews
     else:
         log.info(f"No reviews found for restaurant {restaurant_id}.")
-        return []
-    
-def fetch_reviews_by_user(user_id):
+    return reviews, next_cursor
+
+async def fetch_reviews_by_user(user_id, sort='recency', page_size=None, cursor=None):
+    """
+    Return (reviews, next_cursor) written by a user, sorted in Elasticsearch by recency or rating.
+    """
     log.info("fetching user reviews...")
-    # index_name = "user_reviews"
-    index_name = constants.USER_REVIEWS
-    query = {
-        "query": {
-            "match": {
-                "user_id": user_id
-            }
-        }
-    }
-    log.info(f"query -> {query}")
-    response = es.search(index=index_name, body=query)
-    if response['hits']['total']['value'] > 0:
-        reviews = [hit['_source'] for hit in response['hits']['hits']]
+    reviews, next_cursor = await _fetch_reviews("user_id", user_id, sort, page_size, cursor)
+    if reviews:
         log.info(f"Found {len(reviews)} reviews for user {user_id}.")
-        return reviews
     else:
         log.info(f"No reviews given by user {user_id}.")
-        return []
-    
-def reverse_geocode(latitude, longitude,api_key):
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={latitude},{longitude}&key={api_key}"
-    response = requests.get(url,verify=False)
-    if response.status_code == 200:
-        result = response.json().get('results', [])
-        if result:
-            return result[0].get('formatted_address')
-        else:
-            raise Exception("Coordinates not found.")
-    else:
-        raise Exception(f"Error in reverse geocoding: {response.content}")
-    
-def get_reviews_with_restaurant_details(restaurant_id: str, api_key: str):
+    return reviews, next_cursor
+
+async def get_reviews_with_restaurant_details(restaurant_id: str, sort='recency', page_size=None, cursor=None):
     log.info(f"Fetching reviews and details for restaurant ID: {restaurant_id}")
     
     # Fetch reviews based on the restaurant ID
-    reviews = fetch_reviews_by_restaurant(restaurant_id)
+    reviews, next_cursor = await fetch_reviews_by_restaurant(restaurant_id, sort, page_size, cursor)
     
-    print("reviews fetched for restaurant_id ",reviews)
+    log.debug("Reviews fetched for restaurant_id %s: %s", restaurant_id, reviews)
     if reviews:
         # Fetch restaurant details
-        restaurant_details = get_restaurant_details(api_key, restaurant_id)
+        restaurant_details = await get_restaurant_details(restaurant_id)
         
         if restaurant_details:
             # Extract relevant restaurant information
             restaurant_name = restaurant_details.get('name')
             #restaurant_address = restaurant_details.get('formatted_address')
-            locality = extract_locality_from_adr_address(restaurant_details.get('adr_address'))
+            locality = get_locality(restaurant_details)
             maps_url = restaurant_details.get('url')
             
             # Combine restaurant information with each review
@@ -459,71 +867,72 @@ def get_reviews_with_restaurant_details(restaurant_id: str, api_key: str):
                 }
                 for review in reviews
             ]
-            return enhanced_reviews
+            return enhanced_reviews, next_cursor
         else:
             log.warning(f"Restaurant details not found for ID: {restaurant_id}")
-            return []
+            return [], None
     else:
         log.info(f"No reviews found for restaurant ID: {restaurant_id}")
-        return []
+        return [], None
 
-def get_reviews_with_restaurant_details_for_user_id(user_id: str, api_key: str):
+async def get_reviews_with_restaurant_details_for_user_id(user_id: str, sort='recency', page_size=None, cursor=None):
     log.info(f"Fetching reviews for user ID: {user_id}")
     
     # Fetch reviews based on the user ID
-    reviews = fetch_reviews_by_user(user_id)
-    print("reviews fetched from db",reviews)
-    
-    if reviews:
-        # Get a unique list of restaurant IDs from the reviews
-        restaurant_ids = {review['restaurant_id'] for review in reviews}
-        enhanced_reviews = []
-
-        for restaurant_id in restaurant_ids:
-            # Fetch restaurant details
-            restaurant_details = get_restaurant_details(api_key, restaurant_id)
-            
-            if restaurant_details:
-                # Extract relevant restaurant information
-                restaurant_name = restaurant_details.get('name')
-                restaurant_address = extract_locality_from_adr_address(restaurant_details.get('adr_address'))
-                maps_url = restaurant_details.get('url')
-                
-                # Combine restaurant information with each relevant review
-                for review in reviews:
-                    if review['restaurant_id'] == restaurant_id:
-                        enhanced_reviews.append({
-                            "restaurant_name": restaurant_name,
-                            "restaurant_address": restaurant_address,
-                            "maps_url": maps_url,
-                            "review_text": review.get('review_text'),
-                            "rating": review.get('rating'),
-                            "created_at": review.get('created_at'),
-                            "user_id": review.get('user_id'),
-                            "author_name":review.get('author_name')
-                        })
-                        
-        return enhanced_reviews
-    else:
+    reviews, next_cursor = await fetch_reviews_by_user(user_id, sort, page_size, cursor)
+    if not reviews:
         log.info(f"No reviews found for user ID: {user_id}")
-        return []
+        return [], None
 
+    return await _join_reviews_with_restaurant_details(reviews), next_cursor
+
+async def stream_reviews_with_restaurant_details_for_user_id(user_id: str, sort='recency'):
+    """
+    Yield all of a user's reviews joined with restaurant details, one ES page
+    at a time, so the first rows go out before the last page is read.
+    """
+    log.info(f"Streaming reviews for user ID: {user_id}")
+    cursor = None
+    while True:
+        reviews, cursor = await fetch_reviews_by_user(user_id, sort, server_properties.MAX_PAGE_SIZE, cursor)
+        if reviews:
+            yield await _join_reviews_with_restaurant_details(reviews)
+        if not cursor:
+            break
+
+async def _join_reviews_with_restaurant_details(reviews):
+    """
+    Attach restaurant name, locality and maps URL to each review, keeping the
+    review order. All restaurants are resolved with one batched lookup.
+    """
+    details_by_id = await get_restaurant_details_batch(review.get('restaurant_id') for review in reviews)
+
+    enhanced_reviews = []
+    for review in reviews:
+        restaurant_details = details_by_id.get(review.get('restaurant_id'))
+        if not restaurant_details:
+            continue
+        enhanced_reviews.append({
+            "restaurant_name": restaurant_details.get('name'),
+            "restaurant_address": get_locality(restaurant_details),
+            "maps_url": restaurant_details.get('url'),
+            "review_text": review.get('review_text'),
+            "rating": review.get('rating'),
+            "created_at": review.get('created_at'),
+            "user_id": review.get('user_id'),
+            "author_name": review.get('author_name')
+        })
+    return enhanced_reviews
 
-def extract_locality_from_adr_address(adr_address):
-    if adr_address:
-        soup = BeautifulSoup(adr_address, 'html.parser')
-        print("soup ->",soup)
-        locality = soup.find('span', {'class': 'locality'})
-        return locality.text if locality else None
-    return None
 
 # Function to remove favorite from Elasticsearch
-def remove_user_favorite(favorite_id):
-    print("favorite_id",favorite_id)
+async def remove_user_favorite(favorite_id, user_id):
+    log.debug("Removing favorite_id %s", favorite_id)
     # index_name = "user_favorites"
     index_name = constants.USER_FAVORITES
-    response = es.delete_by_query(
+    response = await get_es().delete_by_query(
         index=index_name,
+        refresh=True,
         body = {
             "query": {
                 "term": {
@@ -533,5 +942,6 @@ def remove_user_favorite(favorite_id):
         }
 
     )
-    print("response ",response)
+    log.debug("Delete response: %s", response)
+    _get_favorite_ids_cache().invalidate(user_id)
     return response
\ No newline at end of file
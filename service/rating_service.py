@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import math
+import os
+import server_properties
+import logger
+from helper import constants
+from helper.es_client import get_es, bulk_in_chunks
+
+log = logger.get_logger()
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Open lock file while this process is the one running the reconcile
+_reconcile_lock_file = None
+
+RATING_BUCKETS = ["1", "2", "3", "4", "5"]
+
+# Adds one rating to a restaurant's summary, creating the summary on first use
+_ADD_RATING_SCRIPT = """
+if (ctx._source.count == null) {
+    ctx._source.restaurant_id = params.restaurant_id;
+    ctx._source.count = 0;
+    ctx._source.sum = 0.0;
+    ctx._source.histogram = new HashMap();
+}
+ctx._source.count += 1;
+ctx._source.sum += params.rating;
+ctx._source.histogram[params.bucket] = ctx._source.histogram.getOrDefault(params.bucket, 0) + 1;
+ctx._source.updated_at = params.updated_at;
+"""
+
+
+def rating_bucket(rating):
+    """
+    Histogram bucket of a rating: the nearest whole star, halves rounding up.
+    """
+    return str(min(5, max(1, int(math.floor(float(rating) + 0.5)))))
+
+def _summary_response(restaurant_id, source=None):
+    source = source or {}
+    count = source.get('count', 0)
+    histogram = source.get('histogram') or {}
+    return {
+        "restaurant_id": restaurant_id,
+        "count": count,
+        "average": round(source['sum'] / count, 2) if count else None,
+        "histogram": {bucket: histogram.get(bucket, 0) for bucket in RATING_BUCKETS}
+    }
+
+
+async def record_review_rating(restaurant_id, rating):
+    """
+    Incrementally add a newly written review's rating to the restaurant's summary.
+    """
+    index_name = constants.RESTAURANT_RATING_SUMMARY
+    await get_es().update(
+        index=index_name,
+        id=restaurant_id,
+        script={
+            "source": _ADD_RATING_SCRIPT,
+            "lang": "painless",
+            "params": {
+                "restaurant_id": restaurant_id,
+                "rating": float(rating),
+                "bucket": rating_bucket(rating),
+                "updated_at": datetime.datetime.utcnow().isoformat()
+            }
+        },
+        scripted_upsert=True,
+        upsert={},
+        retry_on_conflict=5
+    )
+    log.info(f"Updated rating summary for restaurant {restaurant_id}.")
+
+async def get_rating_summaries(restaurant_ids):
+    """
+    Return {restaurant_id: summary} for many restaurants with one mget.
+    Restaurants without reviews get an empty summary.
+    """
+    restaurant_ids = list(dict.fromkeys(rid for rid in restaurant_ids if rid))
+    if not restaurant_ids:
+        return {}
+
+    index_name = constants.RESTAURANT_RATING_SUMMARY
+    response = await get_es().options(ignore_status=404).mget(index=index_name, ids=restaurant_ids)
+    summaries = {rid: _summary_response(rid) for rid in restaurant_ids}
+    for doc in response.get('docs', []):
+        if doc.get('found'):
+            summaries[doc['_id']] = _summary_response(doc['_id'], doc['_source'])
+    return summaries
+
+
+async def reconcile_rating_summaries():
+    """
+    Rebuild every rating summary from the reviews index, correcting any drift
+    from missed or concurrent incremental updates.
+    """
+    log.info("Reconciling restaurant rating summaries...")
+    es = get_es()
+    aggregation = {
+        "restaurants": {
+            "composite": {
+                "size": server_properties.ES_BULK_CHUNK_SIZE,
+                "sources": [{"restaurant_id": {"terms": {"field": "restaurant_id.keyword"}}}]
+            },
+            "aggs": {
+                "rating_sum": {"sum": {"field": "rating"}},
+                "stars": {"histogram": {"field": "rating", "interval": 1, "offset": 0.5, "min_doc_count": 1}}
+            }
+        }
+    }
+    updated_at = datetime.datetime.utcnow().isoformat()
+    total = 0
+    after_key = None
+    while True:
+        if after_key:
+            aggregation["restaurants"]["composite"]["after"] = after_key
+        response = await es.search(index=constants.USER_REVIEWS, size=0, aggs=aggregation)
+        buckets = response['aggregations']['restaurants']['buckets']
+        if not buckets:
+            break
+
+        actions = []
+        for bucket in buckets:
+            restaurant_id = bucket['key']['restaurant_id']
+            histogram = {}
+            for star in bucket['stars']['buckets']:
+                label = rating_bucket(star['key'] + 0.5)
+                histogram[label] = histogram.get(label, 0) + star['doc_count']
+            actions.append({
+                "_op_type": "index",
+                "_index": constants.RESTAURANT_RATING_SUMMARY,
+                "_id": restaurant_id,
+                "_source": {
+                    "restaurant_id": restaurant_id,
+                    "count": bucket['doc_count'],
+                    "sum": bucket['rating_sum']['value'],
+                    "histogram": histogram,
+                    "updated_at": updated_at
+                }
+            })
+        success, _ = await bulk_in_chunks(actions)
+        total += success
+
+        after_key = response['aggregations']['restaurants'].get('after_key')
+        if not after_key:
+            break
+    log.info(f"Reconciled {total} restaurant rating summaries.")
+    return total
+
+def _acquire_reconcile_lock():
+    """
+    Try to become the process that runs the reconcile. The lock is an flock
+    on RATING_RECONCILE_LOCK_FILE, held until this process exits, so with
+    several workers only one reconciles and another takes over when it
+    is recycled.
+    """
+    global _reconcile_lock_file
+    if _reconcile_lock_file is not None or fcntl is None:
+        return True
+    lock_file = open(server_properties.RATING_RECONCILE_LOCK_FILE, "a")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _reconcile_lock_file = lock_file
+    log.info(f"Process {os.getpid()} runs the rating summary reconcile.")
+    return True
+
+async def run_rating_reconcile_loop():
+    """
+    Periodically reconcile rating summaries; runs until cancelled.
+    Every worker runs this loop but only the lock holder reconciles.
+    """
+    interval = server_properties.RATING_RECONCILE_INTERVAL_MINUTES * 60
+    while True:
+        await asyncio.sleep(interval)
+        if not _acquire_reconcile_lock():
+            continue
+        try:
+            await reconcile_rating_summaries()
+        except Exception as e:
+            log.error(f"Rating summary reconcile failed: {e}")
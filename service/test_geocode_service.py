@@ -0,0 +1,73 @@
+import asyncio
+import datetime
+from service import geocode_service
+
+
+class FakeGeocodeES:
+    def __init__(self, documents=None):
+        self.documents = documents or {}
+        self.indexed = {}
+
+    def options(self, **kwargs):
+        return self
+
+    async def get(self, index, id):
+        if id in self.documents:
+            return {"found": True, "_source": self.documents[id]}
+        return {"found": False}
+
+    async def index(self, index, id, document):
+        self.indexed[id] = document
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class FakeGoogleClient:
+    def __init__(self):
+        self.geocodes = []
+
+    async def geocode(self, address):
+        self.geocodes.append(address)
+        return FakeResponse(200, {"results": [{
+            "formatted_address": "Times Square, New York, NY, USA",
+            "geometry": {"location": {"lat": 40.758, "lng": -73.9855}},
+        }]})
+
+
+def test_normalize_address_ignores_case_spacing_and_commas():
+    assert geocode_service.normalize_address("  Times   Square ,New York, ") == "times square, new york"
+    assert geocode_service.normalize_address("TIMES SQUARE, NEW YORK") == "times square, new york"
+
+def test_quantize_coordinates_rounds_to_the_configured_precision():
+    assert geocode_service.quantize_coordinates("40.712812", -74.006015) == (40.7128, -74.006)
+
+def test_fresh_persisted_geocode_skips_google(monkeypatch):
+    doc_id = geocode_service._geocode_doc_id("forward", "times square, new york")
+    es = FakeGeocodeES({doc_id: {
+        "latitude": 40.758, "longitude": -73.9855, "cached_at": datetime.datetime.utcnow().isoformat()
+    }})
+    google = FakeGoogleClient()
+    monkeypatch.setattr(geocode_service, "get_es", lambda: es)
+    monkeypatch.setattr(geocode_service, "get_google_client", lambda: google)
+
+    assert asyncio.run(geocode_service._load_lat_long("times square, new york")) == (40.758, -73.9855)
+    assert google.geocodes == []
+
+def test_expired_persisted_geocode_is_fetched_and_stored_again(monkeypatch):
+    doc_id = geocode_service._geocode_doc_id("forward", "times square, new york")
+    stale = (datetime.datetime.utcnow() - datetime.timedelta(days=365)).isoformat()
+    es = FakeGeocodeES({doc_id: {"latitude": 0.0, "longitude": 0.0, "cached_at": stale}})
+    google = FakeGoogleClient()
+    monkeypatch.setattr(geocode_service, "get_es", lambda: es)
+    monkeypatch.setattr(geocode_service, "get_google_client", lambda: google)
+
+    assert asyncio.run(geocode_service._load_lat_long("times square, new york")) == (40.758, -73.9855)
+    assert google.geocodes == ["times square, new york"]
+    assert es.indexed[doc_id]["kind"] == "forward"
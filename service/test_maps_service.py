@@ -0,0 +1,171 @@
+import asyncio
+from service import maps_service
+
+
+class FakeFavoritesES:
+    def __init__(self, restaurant_ids):
+        self.restaurant_ids = restaurant_ids
+        self.searches = 0
+
+    async def search(self, **kwargs):
+        self.searches += 1
+        hits = [{"_source": {"restaurant_id": restaurant_id}} for restaurant_id in self.restaurant_ids]
+        return {"hits": {"hits": hits}}
+
+
+def test_favorite_ids_are_cached_per_user(monkeypatch):
+    es = FakeFavoritesES(["a", "b"])
+    monkeypatch.setattr(maps_service, "get_es", lambda: es)
+    monkeypatch.setattr(maps_service, "_favorite_ids_cache", None)
+
+    assert asyncio.run(maps_service.fetch_user_favorite_ids("user-1")) == {"a", "b"}
+    assert asyncio.run(maps_service.fetch_user_favorite_ids("user-1")) == {"a", "b"}
+    assert es.searches == 1
+
+    maps_service._get_favorite_ids_cache().invalidate("user-1")
+    asyncio.run(maps_service.fetch_user_favorite_ids("user-1"))
+    assert es.searches == 2
+
+def test_anonymous_users_have_no_favorites(monkeypatch):
+    es = FakeFavoritesES(["a"])
+    monkeypatch.setattr(maps_service, "get_es", lambda: es)
+    assert asyncio.run(maps_service.fetch_user_favorite_ids(None)) == frozenset()
+    assert es.searches == 0
+
+def test_store_nearby_restaurants_upserts_one_document_per_place(monkeypatch):
+    captured = {}
+
+    async def ensure_indices():
+        pass
+
+    async def bulk_in_chunks(actions, refresh=None):
+        captured["actions"], captured["refresh"] = actions, refresh
+        return len(actions), []
+
+    monkeypatch.setattr(maps_service, "ensure_indices", ensure_indices)
+    monkeypatch.setattr(maps_service, "bulk_in_chunks", bulk_in_chunks)
+    restaurants = [
+        {"id": "place-1", "name": "One", "latitude": 40.7, "longitude": -74.0},
+        {"id": None, "name": "No place ID"},
+    ]
+    asyncio.run(maps_service.store_nearby_restaurants(restaurants, " Restaurant ", ["dr5reg"], refresh="wait_for"))
+
+    assert captured["refresh"] == "wait_for"
+    [action] = captured["actions"]
+    assert action["_op_type"] == "update"
+    assert action["_id"] == "place-1"
+    assert action["scripted_upsert"] is True and action["upsert"] == {}
+    params = action["script"]["params"]
+    assert params["keyword"] == "restaurant"
+    assert params["tiles"] == ["restaurant:dr5reg"]
+    assert params["restaurant"]["location"] == {"lat": 40.7, "lon": -74.0}
+    assert "fetched_at" in params["restaurant"]
+    # The caller's dicts are left untouched
+    assert "location" not in restaurants[0]
+
+
+class FakeDetailsES:
+    """mget against the details index; documents=None behaves like a missing index."""
+
+    def __init__(self, documents=None):
+        self.documents = documents
+        self.ignore_status = None
+
+    def options(self, ignore_status=None, **kwargs):
+        self.ignore_status = ignore_status
+        return self
+
+    async def mget(self, index, ids):
+        if self.documents is None:
+            assert self.ignore_status == 404, "a missing index would raise NotFoundError"
+            return {"error": {"type": "index_not_found_exception"}, "status": 404}
+        return {"docs": [
+            {"_id": rid, "found": True, "_source": self.documents[rid]} if rid in self.documents
+            else {"_id": rid, "found": False}
+            for rid in ids
+        ]}
+
+
+def _fake_google_details(fetched):
+    async def fetch_restaurant_details_from_google(restaurant_id):
+        fetched.append(restaurant_id)
+        return {"place_id": restaurant_id, "name": f"Google {restaurant_id}"}
+    return fetch_restaurant_details_from_google
+
+def test_details_batch_reads_fresh_documents_and_fetches_the_rest(monkeypatch):
+    cached_at = maps_service.datetime.datetime.utcnow().isoformat()
+    es = FakeDetailsES({
+        "batch-fresh": {"place_id": "batch-fresh", "name": "Fresh", "cached_at": cached_at},
+        "batch-legacy": {"place_id": "batch-legacy", "name": "No cached_at"},
+    })
+    fetched = []
+    monkeypatch.setattr(maps_service, "get_es", lambda: es)
+    monkeypatch.setattr(maps_service, "fetch_restaurant_details_from_google", _fake_google_details(fetched))
+
+    details = asyncio.run(maps_service.get_restaurant_details_batch(["batch-fresh", "batch-legacy", "", "batch-fresh"]))
+    assert details["batch-fresh"] == {"place_id": "batch-fresh", "name": "Fresh"}
+    assert details["batch-legacy"]["name"] == "Google batch-legacy"
+    assert fetched == ["batch-legacy"]
+
+def test_details_batch_tolerates_a_missing_details_index(monkeypatch):
+    fetched = []
+    monkeypatch.setattr(maps_service, "get_es", lambda: FakeDetailsES())
+    monkeypatch.setattr(maps_service, "fetch_restaurant_details_from_google", _fake_google_details(fetched))
+
+    details = asyncio.run(maps_service.get_restaurant_details_batch(["batch-no-index"]))
+    assert details["batch-no-index"]["name"] == "Google batch-no-index"
+    assert fetched == ["batch-no-index"]
+
+def test_parse_adr_address_splits_the_microformat():
+    adr_address = (
+        '<span class="street-address">1 Main St</span>, <span class="locality">Springfield</span>, '
+        '<span class="region">IL</span> <span class="postal-code">62701</span>, '
+        '<span class="country-name">USA</span>'
+    )
+    assert maps_service.parse_adr_address(adr_address) == {
+        "street_address": "1 Main St",
+        "locality": "Springfield",
+        "region": "IL",
+        "postal_code": "62701",
+        "country_name": "USA",
+    }
+    assert maps_service.parse_adr_address(None) == {}
+
+def test_store_restaurant_details_adds_address_parts_and_skips_empty_payloads(monkeypatch):
+    indexed = {}
+
+    class FakeIndexES:
+        async def index(self, index, id, document):
+            indexed[id] = document
+
+    monkeypatch.setattr(maps_service, "get_es", lambda: FakeIndexES())
+    details = asyncio.run(maps_service.store_restaurant_details({
+        "place_id": "place-1", "adr_address": '<span class="locality">Springfield</span>'
+    }))
+    assert details["address_parts"] == {"locality": "Springfield"}
+    assert "cached_at" not in details and "cached_at" in indexed["place-1"]
+
+    assert asyncio.run(maps_service.store_restaurant_details({})) == {}
+    assert list(indexed) == ["place-1"]
+
+def test_reviews_are_joined_with_details_in_one_batch(monkeypatch):
+    batches = []
+
+    async def get_restaurant_details_batch(restaurant_ids):
+        restaurant_ids = list(restaurant_ids)
+        batches.append(restaurant_ids)
+        return {"r1": {"name": "One", "url": "https://maps/r1", "address_parts": {"locality": "NYC"}}}
+
+    monkeypatch.setattr(maps_service, "get_restaurant_details_batch", get_restaurant_details_batch)
+    reviews = [
+        {"restaurant_id": "r1", "rating": 5, "review_text": "great"},
+        {"restaurant_id": "gone", "rating": 1},
+        {"restaurant_id": "r1", "rating": 4, "review_text": "good"},
+    ]
+    joined = asyncio.run(maps_service._join_reviews_with_restaurant_details(reviews))
+
+    assert batches == [["r1", "gone", "r1"]]
+    assert [review["review_text"] for review in joined] == ["great", "good"]
+    assert joined[0]["restaurant_name"] == "One"
+    assert joined[0]["restaurant_address"] == "NYC"
+    assert joined[0]["maps_url"] == "https://maps/r1"
@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from service import rating_service
+
+
+class FakeSummaryES:
+    def __init__(self, documents):
+        self.documents = documents
+        self.requested = None
+
+    def options(self, **kwargs):
+        return self
+
+    async def mget(self, index, ids):
+        self.requested = ids
+        return {"docs": [
+            {"_id": rid, "found": True, "_source": self.documents[rid]} if rid in self.documents
+            else {"_id": rid, "found": False}
+            for rid in ids
+        ]}
+
+
+@pytest.mark.parametrize("rating, bucket", [
+    (1, "1"), (1.49, "1"), (1.5, "2"), (4.5, "5"), (5, "5"), (0, "1"), (7, "5"), ("3", "3"),
+])
+def test_rating_bucket_rounds_half_up_within_one_to_five(rating, bucket):
+    assert rating_service.rating_bucket(rating) == bucket
+
+def test_summary_response_averages_and_fills_every_bucket():
+    summary = rating_service._summary_response("r1", {"count": 3, "sum": 13.0, "histogram": {"4": 2, "5": 1}})
+    assert summary == {
+        "restaurant_id": "r1",
+        "count": 3,
+        "average": 4.33,
+        "histogram": {"1": 0, "2": 0, "3": 0, "4": 2, "5": 1},
+    }
+
+def test_summary_response_without_reviews():
+    summary = rating_service._summary_response("r1")
+    assert summary["count"] == 0 and summary["average"] is None
+    assert set(summary["histogram"].values()) == {0}
+
+def test_get_rating_summaries_uses_one_mget_and_skips_empty_ids(monkeypatch):
+    es = FakeSummaryES({"a": {"count": 1, "sum": 4.0, "histogram": {"4": 1}}})
+    monkeypatch.setattr(rating_service, "get_es", lambda: es)
+
+    summaries = asyncio.run(rating_service.get_rating_summaries(["a", "", "b", "a"]))
+    assert es.requested == ["a", "b"]
+    assert summaries["a"]["average"] == 4.0
+    assert summaries["b"]["count"] == 0
+    assert "" not in summaries
@@ -0,0 +1,93 @@
+import asyncio
+
+from service import user_service
+from service.user_service import UserService, normalize_email
+
+
+def test_normalize_email_strips_and_lowercases():
+    assert normalize_email("  Ana@Example.COM ") == "ana@example.com"
+
+
+def _migrate(monkeypatch, hits, create_failures=()):
+    calls = []
+
+    async def fake_scan(es, index, query):
+        for hit in hits:
+            yield hit
+
+    async def fake_bulk(actions, refresh=False):
+        actions = list(actions)
+        calls.append(actions)
+        if actions and actions[0]["_op_type"] == "create":
+            failed = [{"create": {"_id": action["_id"]}} for action in actions if action["_id"] in create_failures]
+            return len(actions) - len(failed), failed
+        return len(actions), []
+
+    monkeypatch.setattr(user_service, "get_es", lambda: object())
+    monkeypatch.setattr(user_service, "async_scan", fake_scan)
+    monkeypatch.setattr(user_service, "bulk_in_chunks", fake_bulk)
+    return asyncio.run(UserService().migrate_legacy_users()), calls
+
+
+def test_migrate_legacy_users_rekeys_by_normalized_email(monkeypatch):
+    hits = [
+        {"_id": "abc", "_source": {"email": "Ana@Example.com", "name": "Ana"}},
+        {"_id": "bob@example.com", "_source": {"email": "bob@example.com"}},
+    ]
+
+    result, (creates, deletes) = _migrate(monkeypatch, hits)
+
+    assert creates == [{
+        "_op_type": "create",
+        "_index": user_service.USER_INDEX,
+        "_id": "ana@example.com",
+        "_source": {"email": "ana@example.com", "name": "Ana"},
+    }]
+    assert deletes == [{"_op_type": "delete", "_index": user_service.USER_INDEX, "_id": "abc"}]
+    assert result == {"migrated": 1, "failed": [], "collisions": {}}
+
+
+def test_migrate_legacy_users_skips_case_variant_duplicates(monkeypatch):
+    hits = [
+        {"_id": "abc", "_source": {"email": "Ana@Example.com"}},
+        {"_id": "def", "_source": {"email": "ana@example.com"}},
+        {"_id": "carl@example.com", "_source": {"email": "carl@example.com"}},
+        {"_id": "ghi", "_source": {"email": "CARL@example.com"}},
+    ]
+
+    result, (creates, deletes) = _migrate(monkeypatch, hits)
+
+    assert creates == [] and deletes == []
+    assert result["migrated"] == 0
+    assert result["collisions"] == {
+        "ana@example.com": ["abc", "def"],
+        "carl@example.com": ["carl@example.com", "ghi"],
+    }
+
+
+def test_migrate_legacy_users_keeps_old_document_when_create_fails(monkeypatch):
+    hits = [
+        {"_id": "abc", "_source": {"email": "ana@example.com"}},
+        {"_id": "def", "_source": {"email": "dan@example.com"}},
+    ]
+
+    result, (_, deletes) = _migrate(monkeypatch, hits, create_failures={"ana@example.com"})
+
+    assert deletes == [{"_op_type": "delete", "_index": user_service.USER_INDEX, "_id": "def"}]
+    assert result == {"migrated": 1, "failed": ["ana@example.com"], "collisions": {}}
+
+
+def test_google_auth_login_does_not_issue_a_token(monkeypatch):
+    stored = {"user_id": "u1", "email": "ana@example.com", "username": "ana", "password": "x"}
+
+    async def fake_get_user_by_email(self, email):
+        assert email == "ana@example.com"
+        return email, stored
+
+    monkeypatch.setattr(UserService, "_get_user_by_email", fake_get_user_by_email)
+
+    response = asyncio.run(UserService().google_auth(" Ana@Example.com", "any-sub", "ana"))
+
+    assert response["success"] is True
+    assert response["result"] == {"user_id": "u1", "email": "ana@example.com", "username": "ana"}
+    assert "access_token" not in response and "access_token" not in response["result"]
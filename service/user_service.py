@@ -1,53 +1,20 @@
-import bcrypt
 import uuid
 import datetime
-from datetime import timedelta
-import jwt
-from elasticsearch import Elasticsearch
 import server_properties
 import logging
 from helper import notification
 import string
 import secrets
+from elasticsearch import ConflictError
 from helper import constants
+from elasticsearch.helpers import async_scan
+from helper.es_client import get_es, bulk_in_chunks
+from helper.passwords import hash_password, verify_password, needs_rehash
+from helper.auth import create_access_token
 
 log = logging.getLogger(__name__)
 
-# Elasticsearch connection configuration
-es = Elasticsearch(
-    hosts=[server_properties.ES_HOST],
-    http_auth=(server_properties.ES_USER, server_properties.ES_PASSWORD)
-)
-
-log.info("Connected to Elasticsearch")
-USER_INDEX = "users"
-
-# JWT Configuration
-SECRET_KEY = server_properties.SECRET_KEY  # Use a strong secret key in production
-ALGORITHM = server_properties.ALGORITHM
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-# Password hashing functions
-def hash_password(password: str) -> str:
-    """
-    Hash the password using bcrypt
-    """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(stored_hash: str, password: str) -> bool:
-    """
-    Verify the password with the stored hashed password
-    """
-    return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
-
-def create_access_token(user_id: str):
-    """
-    Create an access token for the user with user_id in the payload.
-    """
-    expires = datetime.datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"user_id": user_id, "exp": expires}
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+USER_INDEX = constants.USER_INDEX
 
 def generate_random_password(length=12):
     """
@@ -62,34 +29,74 @@ def generate_random_password(length=12):
     password = ''.join(secrets.choice(characters) for _ in range(length))
     return password
 
+def normalize_email(email: str) -> str:
+    """
+    Canonical form of an email address; user documents are keyed by it.
+    """
+    return email.strip().lower()
+
 class UserService:
     def __init__(self):
-        self.es = es
         self.index = USER_INDEX
 
-    def signup(self, username: str, password: str, email: str):
+    @property
+    def es(self):
+        # Shared client, resolved lazily so every router uses the same pool
+        return get_es()
+
+    async def _get_user_by_email(self, email: str):
         """
-        Handle user signup.
-        Checks if the email already exists, hashes the password, and stores the user data in Elasticsearch.
+        Return (doc_id, user_data) for the user with this normalized email, or (None, None).
+        Users are stored with the email as _id, so this is a primary-key get.
+        Accounts created before that are found with a keyword search while
+        USERS_LEGACY_LOOKUP is enabled.
         """
-        email = email.lower()
-        # Check if the user already exists based on email
-        query = {
-            "query": {
-                "term": {
-                    "email": email
-                }
-            }
-        }
+        res = await self.es.options(ignore_status=404).get(index=self.index, id=email)
+        if res.get('found'):
+            return res['_id'], res['_source']
+        if server_properties.USERS_LEGACY_LOOKUP:
+            res = await self.es.search(index=self.index, query={"term": {"email.keyword": email}}, size=1)
+            if res['hits']['hits']:
+                hit = res['hits']['hits'][0]
+                return hit['_id'], hit['_source']
+        return None, None
+
+    async def _get_user_by_id(self, user_id: str):
+        """
+        Return (doc_id, user_data) for the user with this user_id, or (None, None).
+        """
+        res = await self.es.search(index=self.index, query={"term": {"user_id.keyword": user_id}}, size=1)
+        if res['hits']['hits']:
+            hit = res['hits']['hits'][0]
+            return hit['_id'], hit['_source']
+        return None, None
 
-        res = self.es.search(index=self.index, body=query)
-        print("res",res)
+    async def _create_user(self, user_data: dict) -> bool:
+        """
+        Store a new user keyed by email. op_type=create makes Elasticsearch reject
+        the write if the email is already taken, so concurrent signups cannot
+        create duplicate accounts. Returns False when the user already exists.
+        """
+        try:
+            await self.es.create(index=self.index, id=user_data["email"], document=user_data)
+        except ConflictError:
+            return False
+        return True
 
-        if res['hits']['total']['value'] > 0:
-            return {"success": False, "error": "User already exists"}
+    async def signup(self, username: str, password: str, email: str):
+        """
+        Handle user signup.
+        Checks if the email already exists, hashes the password, and stores the user data in Elasticsearch.
+        """
+        email = normalize_email(email)
+        # Accounts keyed by email are caught by the create below; only legacy ones need a lookup
+        if server_properties.USERS_LEGACY_LOOKUP:
+            doc_id, _ = await self._get_user_by_email(email)
+            if doc_id:
+                return {"success": False, "error": "User already exists"}
 
         # Hash the password before storing it
-        hashed_password = hash_password(password)
+        hashed_password = await hash_password(password)
 
         # Prepare user data for Elasticsearch document
         user_data = {
@@ -100,40 +107,30 @@ class UserService:
             "created_at": datetime.datetime.utcnow().isoformat(),
         }
 
-        # Index the user document in Elasticsearch
-        self.es.index(index=self.index, document=user_data)
+        # Create the user document, failing if the email is already registered
+        if not await self._create_user(user_data):
+            return {"success": False, "error": "User already exists"}
 
         # Send welcome notification
         subject = "Welcome! Your Guide to Local Restaurants is Here!"
         body = f"Hello {username},\n\nThank you for signing up! We're excited to have you on board."
-        print("subject",subject,"body ",body)
-        notification.send_notification(subject,body,email)  # Calling the function from notification.py
+        log.debug("Welcome email subject: %s body: %s", subject, body)
+        notification.enqueue_notification(subject,body,email)  # Calling the function from notification.py
 
         # Return success with user_id and JWT token
-        return {"success": True, "user_id": user_data["user_id"], "token": create_access_token(user_data["user_id"])}
+        return {"success": True, "user_id": user_data["user_id"], "token": create_access_token(user_data["user_id"], username)}
 
-    def login(self, email: str, password: str):
+    async def login(self, email: str, password: str):
         """
         Handle user login.
         Verifies the user's credentials and returns a JWT token on successful login.
         """
-        email = email.lower()
-        # Check if the user exists based on email
-        query = {
-            "query": {
-                "term": {
-                    "email": email
-                }
-            }
-        }
-
-        res = self.es.search(index=self.index, body=query)
+        email = normalize_email(email)
+        doc_id, user_data = await self._get_user_by_email(email)
 
-        if res['hits']['total']['value'] == 0:
+        if not doc_id:
             return {"success": False, "error": "User Doesn't Exist"}
 
-        user_data = res['hits']['hits'][0]['_source']
-
         result = {
             "user_id":user_data["user_id"],
             "email":user_data["email"],
@@ -142,75 +139,69 @@ class UserService:
         log.info(f"result {result}")
 
         # Verify the password against the stored hash
-        if verify_password(user_data['password'], password):
-            token = create_access_token(user_data["user_id"])
+        if await verify_password(user_data['password'], password):
+            if needs_rehash(user_data['password']):
+                await self._rehash_password(doc_id, password)
+            token = create_access_token(user_data["user_id"], user_data["username"])
             return {"success": True, "result": result, "token": token}
 
         return {"success": False, "error": "Invalid Credentials"}
 
-    def update_user(self, user_id: str, username: str = None, password: str = None):
+    async def _rehash_password(self, doc_id: str, password: str):
+        """
+        Re-hash a verified password at the current BCRYPT_ROUNDS cost.
+        Failures are logged and ignored so they never block a login.
+        """
+        try:
+            hashed_password = await hash_password(password)
+            await self.es.update(index=self.index, id=doc_id, doc={"password": hashed_password})
+            log.info(f"Rehashed password for user document {doc_id}")
+        except Exception as e:
+            log.warning(f"Password rehash failed for user document {doc_id}: {e}")
+
+    async def update_user(self, user_id: str, username: str = None, password: str = None):
         """
         Update the user's details (username or password).
         """
         # Get user data by user_id
-        query = {
-            "query": {
-                "term": {
-                    "user_id": user_id
-                }
-            }
-        }
-
-        res = self.es.search(index=self.index, body=query)
+        doc_id, user_data = await self._get_user_by_id(user_id)
 
-        if res['hits']['total']['value'] == 0:
+        if not doc_id:
             return {"success": False, "error": "User not found"}
 
-        user_data = res['hits']['hits'][0]['_source']
-
         # Prepare the update data
         update_data = {}
 
         if username:
             update_data["username"] = username
         if password:
-            update_data["password"] = hash_password(password)  # Hash the new password
+            update_data["password"] = await hash_password(password)  # Hash the new password
 
         # Update the document in Elasticsearch
         update_query = {
             "doc": update_data
         }
 
-        update_res = self.es.update(index=self.index, id=res['hits']['hits'][0]['_id'], body=update_query)
+        update_res = await self.es.update(index=self.index, id=doc_id, body=update_query)
 
         return {"success": True}
     
-    def update_password(self, email: str, old_password: str, new_password: str):
-
-        email = email.lower()
-        # Search for the user by email
-        query = {
-            "query": {
-                "term": {
-                    "email": email
-                }
-            }
-        }
+    async def update_password(self, email: str, old_password: str, new_password: str):
 
-        res = self.es.search(index=self.index, body=query)
+        email = normalize_email(email)
+        # Look the user up by email
+        doc_id, user_data = await self._get_user_by_email(email)
 
-        if res['hits']['total']['value'] == 0:
+        if not doc_id:
             return {"success": False, "error": "User not found"}
 
-        user_data = res['hits']['hits'][0]['_source']
-
         # Verify the old password
-        if not verify_password(user_data['password'], old_password):
+        if not await verify_password(user_data['password'], old_password):
             return {"success": False, "error": "Old password is incorrect"}
 
         # email = user_data['email']
         # Hash the new password
-        hashed_password = hash_password(new_password)
+        hashed_password = await hash_password(new_password)
 
         # Prepare the update data
         update_data = {
@@ -218,48 +209,38 @@ class UserService:
         }
 
         # Update the document in Elasticsearch
-        self.es.update(index=self.index, id=res['hits']['hits'][0]['_id'], body={"doc": update_data})
+        await self.es.update(index=self.index, id=doc_id, body={"doc": update_data})
 
         # Send a notification email
         subject = "Your Password Has Been Changed Successfully"
         body = f"Hello {user_data['username']},\n\nYour password has been updated successfully. If you did not request this change, please contact support immediately."
-        notification.send_notification(subject, body, email)
+        notification.enqueue_notification(subject, body, email)
 
         return {"success": True}
 
-    def forgot_password(self, email: str):
+    async def forgot_password(self, email: str):
         """
         Generate a temporary password, update the user's password in Elasticsearch,
         and send the password via email.
         """
-        email = email.lower()
+        email = normalize_email(email)
 
         # Check if the user exists based on email
-        query = {
-            "query": {
-                "term": {
-                    "email": email
-                }
-            }
-        }
-
-        res = self.es.search(index=self.index, body=query)
+        doc_id, user_data = await self._get_user_by_email(email)
 
-        if res['hits']['total']['value'] == 0:
+        if not doc_id:
             return {"success": False, "error": "User not found"}
-
-        user_data = res['hits']['hits'][0]['_source']
         user_id = user_data['user_id']
 
         # Generate a temporary password
         temporary_password = generate_random_password()
-        hashed_password = hash_password(temporary_password)
+        hashed_password = await hash_password(temporary_password)
 
         # Update the password in Elasticsearch
         update_data = {
             "password": hashed_password
         }
-        self.es.update(index=self.index, id=res['hits']['hits'][0]['_id'], body={"doc": update_data})
+        await self.es.update(index=self.index, id=doc_id, body={"doc": update_data})
 
         # Send an email with the new password
         subject = "Your OTP for Password Reset"
@@ -270,12 +251,12 @@ class UserService:
                 "If you did not request this change, please contact support immediately.\n\n"
                 "Thank you,\n"
                 "The Eats Near You Team")
-        notification.send_notification(subject, body, email)
+        notification.enqueue_notification(subject, body, email)
 
         return {"success": True, "message": "An OTP has been sent to your email. Please use it to reset your password."}
 
     
-    def submit_feedback(self,user_id,feedback):
+    async def submit_feedback(self,user_id,feedback):
         log.info("inside main logic")
         index = constants.FEEDBACK_INDEX
         document = {
@@ -284,29 +265,22 @@ class UserService:
             "created_at":datetime.datetime.utcnow().isoformat()
         }
         log.info(f"document {document}")
-        es.index(index=index, document=document)
+        await self.es.index(index=index, document=document)
         log.info(f"Stored user feedback to {index} index")
 
         return {"success": True,"message":"Thank you for your feedback! It has been submitted successfully."}
 
-    def google_auth(self, email: str, sub: str, username: str):
+    async def google_auth(self, email: str, sub: str, username: str):
         """
         Handle Google Login or Signup.
         """
-        email = email.lower()
+        email = normalize_email(email)
         # Check if the user already exists
-        query = {
-            "query": {
-                "term": {
-                    "email": email
-                }
-            }
-        }
-        res = self.es.search(index=self.index, body=query)
+        doc_id, user_data = await self._get_user_by_email(email)
 
-        if res['hits']['total']['value'] > 0:
-            # User exists, process login
-            user_data = res['hits']['hits'][0]['_source']
+        if doc_id:
+            # User exists, process login. The Google ID token is not verified
+            # server-side, so no access token is issued here.
 
             result = {
             "user_id":user_data["user_id"],
@@ -321,7 +295,7 @@ class UserService:
             }
 
         # User does not exist, process signup
-        hashed_password = hash_password(sub)  # Hash the 'sub' as the password
+        hashed_password = await hash_password(sub)  # Hash the 'sub' as the password
         user_data = {
             "user_id": str(uuid.uuid4()),  # Generate a unique user ID
             "email": email,
@@ -330,14 +304,15 @@ class UserService:
             "created_at": datetime.datetime.utcnow().isoformat()
         }
 
-        # Store the user in Elasticsearch
-        self.es.index(index=self.index, document=user_data)
+        # Store the user in Elasticsearch; a concurrent Google signup may have won the race
+        if not await self._create_user(user_data):
+            return await self.google_auth(email, sub, username)
 
         # Send a welcome email
         subject = "Welcome! You Signed Up with Google!"
         body = (f"Hello {username},\n\n"
                 "Thank you for signing up with Google! We're excited to have you with us.")
-        notification.send_notification(subject, body, email)
+        notification.enqueue_notification(subject, body, email)
 
         result = {
             "user_id":user_data["user_id"]
@@ -347,4 +322,54 @@ class UserService:
             "success": True,
             "message": "Signup successful via Google",
             "result": result
-        }
\ No newline at end of file
+        }
+
+    async def migrate_legacy_users(self):
+        """
+        Re-key users stored with a random _id so their _id is the normalized email.
+        Each user is copied with op_type=create and the old document is deleted
+        only once the copy succeeded.
+        Emails shared by several user documents once normalized (e.g. differing
+        only in case) are not migrated; they are logged and returned so the
+        accounts can be merged by hand.
+        Returns {"migrated": count, "failed": [emails], "collisions": {email: [doc ids]}}.
+        """
+        users_by_email = {}
+        async for hit in async_scan(self.es, index=self.index, query={"query": {"match_all": {}}}):
+            email = normalize_email(hit['_source'].get('email', ''))
+            if email:
+                users_by_email.setdefault(email, []).append(hit)
+
+        create_actions = []
+        old_ids = {}
+        collisions = {}
+        for email, hits in users_by_email.items():
+            if all(hit['_id'] == email for hit in hits):
+                continue
+            if len(hits) > 1:
+                collisions[email] = sorted(hit['_id'] for hit in hits)
+                continue
+            hit = hits[0]
+            old_ids[email] = hit['_id']
+            create_actions.append({
+                "_op_type": "create",
+                "_index": self.index,
+                "_id": email,
+                "_source": {**hit['_source'], "email": email}
+            })
+
+        _, failed = await bulk_in_chunks(create_actions)
+        failed_ids = {next(iter(error.values()))['_id'] for error in failed}
+        delete_actions = [
+            {"_op_type": "delete", "_index": self.index, "_id": old_id}
+            for email, old_id in old_ids.items()
+            if email not in failed_ids
+        ]
+        migrated, _ = await bulk_in_chunks(delete_actions, refresh=True)
+        for email, doc_ids in collisions.items():
+            log.warning(f"Not migrating {email}: shared by user documents {', '.join(doc_ids)}, merge them by hand.")
+        log.info(
+            f"Migrated {migrated} users to email-keyed documents, {len(failed_ids)} failed, "
+            f"{len(collisions)} emails skipped as duplicates."
+        )
+        return {"migrated": migrated, "failed": sorted(failed_ids), "collisions": collisions}
@@ -1,2 +1,2 @@
-#!bin/bash
-uvicorn app:app --host 0.0.0.0 --port 8080 
\ No newline at end of file
+#!/bin/bash
+exec gunicorn -c gunicorn_conf.py app:app
@@ -0,0 +1,10 @@
+import warnings
+import app
+
+
+def test_default_response_renders_json_without_deprecation_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        response = app.DefaultResponse({"rating": 4.5, 3: None})
+    assert response.media_type == "application/json"
+    assert response.body == b'{"rating":4.5,"3":null}'
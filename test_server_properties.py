@@ -0,0 +1,32 @@
+import pytest
+import server_properties
+from server_properties import Settings
+
+
+def test_from_env_reports_every_missing_variable(monkeypatch):
+    monkeypatch.delenv("GOOGLE_API_KEY")
+    monkeypatch.delenv("SECRET_KEY")
+    with pytest.raises(Exception) as error:
+        Settings.from_env()
+    assert "GOOGLE_API_KEY" in str(error.value)
+    assert "SECRET_KEY" in str(error.value)
+
+def test_from_env_rejects_values_that_do_not_cast(monkeypatch):
+    monkeypatch.setenv("NOTIFICATION_BATCH_SIZE", "many")
+    with pytest.raises(Exception, match="NOTIFICATION_BATCH_SIZE"):
+        Settings.from_env()
+
+def test_from_env_casts_and_defaults_empty_values(monkeypatch):
+    monkeypatch.setenv("NOTIFICATION_RETRY_BASE_SECONDS", "2.5")
+    monkeypatch.setenv("NOTIFICATION_BATCH_SIZE", "")
+    settings = Settings.from_env()
+    assert settings.notification_retry_base_seconds == 2.5
+    assert settings.notification_batch_size == 20
+
+def test_secrets_are_left_out_of_the_repr():
+    assert server_properties.get_settings().google_api_key not in repr(server_properties.get_settings())
+
+def test_module_attributes_resolve_against_settings():
+    assert server_properties.ES_HOST == server_properties.get_settings().es_host
+    with pytest.raises(AttributeError):
+        server_properties.NOT_A_SETTING